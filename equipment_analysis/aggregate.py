@@ -1,90 +1,193 @@
+import argparse
 import pandas as pd
+import rollup_cube
+import storage
 
-# Load the updated CSV file with Equipment Category and Status
+# Input and output files
 updated_ticket_data_path = 'organized_data.csv'  # Replace with your file path
-df = pd.read_csv(updated_ticket_data_path)
-
-# Ensure relevant columns are treated as strings and handle possible NaN values
-if 'Ticket created - Day of month' in df.columns:
-    df['Ticket created - Day of month'] = df['Ticket created - Day of month'].astype(float).fillna(0).astype(int)
-if 'Ticket created - Month' in df.columns:
-    df['Ticket created - Month'] = df['Ticket created - Month'].astype(str).str.strip()
-if 'Ticket created - Year' in df.columns:
-    df['Ticket created - Year'] = df['Ticket created - Year'].astype(str).str.strip()  # Ensure year is string
-
-# Combine 'Ticket created - Day of month', 'Ticket created - Month', and 'Ticket created - Year' into a single 'Date' column
-if all(col in df.columns for col in ['Ticket created - Day of month', 'Ticket created - Month', 'Ticket created - Year']):
-    df['Date'] = df.apply(lambda row: f"{row['Ticket created - Month']}/{row['Ticket created - Day of month']:02d}/{row['Ticket created - Year']}", axis=1)
-
-    # Replace month names with numerical values for proper datetime conversion
-    month_mapping = {
-        'January': '01', 'February': '02', 'March': '03', 'April': '04', 'May': '05', 'June': '06',
-        'July': '07', 'August': '08', 'September': '09', 'October': '10', 'November': '11', 'December': '12'
+aggregated_output_path = 'aggregated_data.csv'  # Replace with your desired output file path
+update_rollup_cube = True  # Fold each aggregated batch into rollup_cube.sqlite for trend queries
+
+# Month names accepted in 'Ticket created - Month' alongside month numbers
+month_mapping = {
+    'January': 1, 'February': 2, 'March': 3, 'April': 4, 'May': 5, 'June': 6,
+    'July': 7, 'August': 8, 'September': 9, 'October': 10, 'November': 11, 'December': 12
+}
+
+date_part_columns = ['Ticket created - Day of month', 'Ticket created - Month', 'Ticket created - Year']
+output_columns = ['Date', 'Ticket subject', 'Tickets', 'Equipment Status', 'Equipment Category', 'Solved Tickets']
+count_columns = ['Tickets', 'Solved Tickets']
+
+# Function to assemble the 'Date' column straight from the numeric day, month and year columns
+def build_dates(df):
+    day = pd.to_numeric(df['Ticket created - Day of month'], errors='coerce')
+    year = pd.to_numeric(df['Ticket created - Year'], errors='coerce')
+
+    # Months may be numbers or month names
+    month = pd.to_numeric(df['Ticket created - Month'], errors='coerce')
+    month = month.fillna(df['Ticket created - Month'].astype(str).str.strip().map(month_mapping))
+
+    # Invalid or missing parts become NaT
+    return pd.to_datetime(pd.DataFrame({'year': year, 'month': month, 'day': day}), errors='coerce')
+
+# Function to build the aggregated ticket rows, one per ticket with a valid date, without any totals
+def build_ticket_rows(df):
+    # Combine 'Ticket created - Day of month', 'Ticket created - Month', and 'Ticket created - Year' into a single 'Date' column
+    if all(col in df.columns for col in date_part_columns):
+        dates = build_dates(df)
+
+        # Drop rows where 'Date' is NaT (Not a Time) after conversion
+        df = df[dates.notna()].assign(Date=dates[dates.notna()])
+    else:
+        print("Date columns not found, skipping Date creation.")
+
+    # We will now handle 'Ticket solved - Date'
+    solved_dates = pd.to_datetime(df['Ticket solved - Date'], errors='coerce')
+
+    # Create a column 'Solved Tickets' where if 'Ticket solved - Date' is not NaT, it is considered solved
+    df = df.assign(**{'Ticket solved - Date': solved_dates, 'Solved Tickets': solved_dates.notna().astype(int)})
+
+    # Now, select the required columns: 'Date', 'Tickets', 'Ticket subject', 'Equipment Status', 'Equipment Category', 'Solved Tickets'
+    available_columns = [col for col in output_columns if col in df.columns]
+
+    if len(available_columns) < len(output_columns):
+        missing_columns = [col for col in output_columns if col not in df.columns]
+        print(f"Warning: The following required columns are missing: {missing_columns}")
+
+    final_aggregated_data = df[available_columns].copy()  # Select whatever is available
+
+    # Format the 'Date' column to include only the date part (YYYY-MM-DD)
+    final_aggregated_data['Date'] = final_aggregated_data['Date'].dt.strftime('%Y-%m-%d')
+
+    # Ensure the count columns contain whole numbers
+    for col in count_columns:
+        if col in final_aggregated_data.columns:
+            final_aggregated_data[col] = pd.to_numeric(final_aggregated_data[col], errors='coerce').fillna(0).astype(int)
+
+    # Status and category repeat a handful of values, so group on categorical codes
+    for col in ['Equipment Status', 'Equipment Category']:
+        if col in final_aggregated_data.columns:
+            final_aggregated_data[col] = final_aggregated_data[col].astype('category')
+
+    return final_aggregated_data
+
+# Function to sum a batch of ticket rows into partial totals. Partials of separate batches merge with merge_totals,
+# so chunked runs produce the same totals as aggregating all rows at once.
+def partial_totals(ticket_rows):
+    return {
+        'groups': ticket_rows.groupby(['Equipment Status', 'Equipment Category'], observed=True)[count_columns].sum(),
+        'totals': ticket_rows[count_columns].sum(),
+        'first_date': ticket_rows['Date'].iloc[0] if not ticket_rows.empty else None
     }
-    df['Date'] = df['Date'].replace(month_mapping, regex=True)
-
-    # Convert the 'Date' column to a datetime format
-    df['Date'] = pd.to_datetime(df['Date'], format='%m/%d/%Y', errors='coerce')
-
-    # Drop rows where 'Date' is NaT (Not a Time) after conversion
-    df = df.dropna(subset=['Date'])
-else:
-    print("Date columns not found, skipping Date creation.")
-
-# We will now handle 'Ticket solved - Date'
-df['Ticket solved - Date'] = pd.to_datetime(df['Ticket solved - Date'], errors='coerce')
-
-# Create a column 'Solved Tickets' where if 'Ticket solved - Date' is not NaT, it is considered solved
-df['Solved Tickets'] = df['Ticket solved - Date'].notna().astype(int)
-
-# Now, select the required columns: 'Date', 'Tickets', 'Ticket subject', 'Equipment Status', 'Equipment Category'
-required_columns = ['Date', 'Ticket subject', 'Tickets', 'Equipment Status', 'Equipment Category']
-available_columns = [col for col in required_columns if col in df.columns]
-
-if len(available_columns) == len(required_columns):
-    final_aggregated_data = df[required_columns]
-else:
-    missing_columns = [col for col in required_columns if col not in df.columns]
-    print(f"Warning: The following required columns are missing: {missing_columns}")
-    final_aggregated_data = df[available_columns]  # Select whatever is available
-
-# Format the 'Date' column to include only the date part (YYYY-MM-DD)
-final_aggregated_data['Date'] = final_aggregated_data['Date'].dt.strftime('%Y-%m-%d')
 
-# Ensure 'Tickets' column contains whole numbers
-if 'Tickets' in final_aggregated_data.columns:
-    final_aggregated_data['Tickets'] = final_aggregated_data['Tickets'].astype(float).fillna(0).astype(int)
-
-# Check the final selected data before calculating totals
-print("\nFinal Aggregated Data before totals:")
-print(final_aggregated_data.head())
-
-# Calculate the total of the 'Tickets' column
-if 'Tickets' in final_aggregated_data.columns:
-    total_tickets = final_aggregated_data['Tickets'].sum()
+# Function to merge two partial totals; None stands for no rows yet, and the earlier batch keeps its first date
+def merge_totals(left, right):
+    if left is None:
+        return right
+    return {
+        'groups': pd.concat([left['groups'], right['groups']]).groupby(level=[0, 1], observed=True).sum(),
+        'totals': left['totals'] + right['totals'],
+        'first_date': left['first_date'] if left['first_date'] is not None else right['first_date']
+    }
 
-    # Use the first date value from the original data for the total row
-    total_date = final_aggregated_data['Date'].iloc[0] if not final_aggregated_data['Date'].empty else 'Total'
-    total_row = pd.DataFrame({'Date': [total_date], 'Tickets': [total_tickets], 'Ticket subject': ['Total'], 'Equipment Status': [''], 'Equipment Category': ['']})
+# Function to build the "Status Total" rows and the grand total row from (merged) partial totals
+def build_total_rows(totals):
+    # Use the first date value from the original data for the totals
+    total_date = totals['first_date'] if totals['first_date'] is not None else 'Total'
 
-    # Calculate totals by Equipment Status and Equipment Category
-    status_totals = final_aggregated_data.groupby(['Equipment Status', 'Equipment Category'])['Tickets'].sum().reset_index()
-    
-    # Create "Status Total" DataFrame with the date included
+    # Create "Status Total" rows and the total row with the date included
+    status_totals = totals['groups'].sort_index().reset_index()
     status_totals['Date'] = total_date
     status_totals['Ticket subject'] = 'Status Total'
-    status_totals = status_totals[['Date', 'Ticket subject', 'Tickets', 'Equipment Status', 'Equipment Category']]
-
-    # Append the status totals and the total row
-    final_aggregated_data = pd.concat([final_aggregated_data, status_totals], ignore_index=True)
-    final_aggregated_data = pd.concat([final_aggregated_data, total_row], ignore_index=True)
-
-# Ensure that the Total column also contains whole numbers
-if 'Total' in final_aggregated_data.columns:
-    final_aggregated_data['Total'] = final_aggregated_data['Total'].astype(float).fillna(0).astype(int)
-
-# Save the final aggregated DataFrame to a new CSV file
-aggregated_output_path = 'aggregated_data.csv'  # Replace with your desired output file path
-final_aggregated_data.to_csv(aggregated_output_path, index=False)
-
-print("Final aggregated data saved to aggregated_data.csv")
+    total_row = pd.DataFrame({'Date': [total_date], 'Tickets': [totals['totals']['Tickets']], 'Ticket subject': ['Total'], 'Equipment Status': [''], 'Equipment Category': [''],
+                              'Solved Tickets': [totals['totals']['Solved Tickets']]})
+    return pd.concat([status_totals[output_columns], total_row[output_columns]], ignore_index=True)
+
+# Function to build the aggregated ticket table with status totals and a grand total
+def aggregate_tickets(df):
+    final_aggregated_data = build_ticket_rows(df)
+
+    # Check the final selected data before calculating totals
+    print("\nFinal Aggregated Data before totals:")
+    print(final_aggregated_data.head())
+
+    # Calculate the totals by Equipment Status and Equipment Category and the grand totals of the 'Tickets' and 'Solved Tickets' columns
+    if 'Tickets' in final_aggregated_data.columns:
+        # Append the status totals and the total row
+        # Totals group on the categoricals; the output keeps plain object columns
+        final_aggregated_data = pd.concat([final_aggregated_data.astype({'Equipment Status': object, 'Equipment Category': object}),
+                                           build_total_rows(partial_totals(final_aggregated_data))], ignore_index=True)
+
+    return final_aggregated_data
+
+# Function to aggregate each created day on its own, exactly as a daily run would, so every day gets its own
+# status totals and total row instead of sharing the first day's
+def aggregate_days(df):
+    daily_results = [aggregate_tickets(day_df)
+                     for _, day_df in df.groupby(['Ticket created - Year', 'Ticket created - Month', 'Ticket created - Day of month'], sort=True)]
+    return pd.concat(daily_results, ignore_index=True) if daily_results else pd.DataFrame(columns=output_columns)
+
+# Function to aggregate organized_data.csv chunk by chunk into aggregated_data.csv. Only one chunk of rows is held
+# in memory; the totals and rollup cube cells are merged across chunks and written once every row is in.
+def aggregate_csv_in_chunks(input_path, output_path, chunk_size, partial_days=False):
+    totals = None
+    cells = None
+    written_columns = None
+    row_count = 0
+
+    for chunk in storage.read_csv_chunks(input_path, chunk_size):
+        ticket_rows = build_ticket_rows(chunk)
+        ticket_rows.to_csv(output_path, mode='w' if written_columns is None else 'a', index=False, header=written_columns is None)
+        written_columns = written_columns or list(ticket_rows.columns)
+        row_count += len(ticket_rows)
+
+        if 'Tickets' in ticket_rows.columns:
+            totals = merge_totals(totals, partial_totals(ticket_rows))
+        if update_rollup_cube:
+            cells = rollup_cube.merge_cells(cells, rollup_cube.build_cells(ticket_rows))
+        print(f"Aggregated {row_count} ticket rows")
+
+    if totals is not None:
+        total_rows = build_total_rows(totals)
+        total_rows.reindex(columns=written_columns).to_csv(output_path, mode='a', index=False, header=False)
+        row_count += len(total_rows)
+
+    # Replace the run's days in the persisted date x status x category cube, or add to them for partial days
+    if cells is not None:
+        rollup_cube.refresh_cube_cells(cells, partial_days=partial_days)
+
+    return row_count
+
+# Entry point: aggregate a DataFrame (or organized_data.csv) and optionally save aggregated_data.csv.
+# With a chunk_size and no DataFrame, organized_data.csv is streamed to aggregated_data.csv and None is returned.
+# Pass partial_days when the tickets are only those new since the last run (an incremental extract without the ticket store),
+# and per_day when the tickets span several created days (read back from the ticket store).
+def main(df=None, write_csv=True, chunk_size=None, partial_days=False, per_day=False):
+    if df is None and chunk_size:
+        row_count = aggregate_csv_in_chunks(updated_ticket_data_path, aggregated_output_path, chunk_size, partial_days)
+        print(f"Final aggregated data saved to aggregated_data.csv ({row_count} rows, {chunk_size} rows per chunk)")
+        return None
+
+    # Load the updated CSV file with Equipment Category and Status when no DataFrame is handed over
+    if df is None:
+        df = pd.read_csv(updated_ticket_data_path)
+
+    final_aggregated_data = aggregate_days(df) if per_day else aggregate_tickets(df)
+
+    # Replace the batch's days in the persisted date x status x category cube, or add to them for partial days
+    if update_rollup_cube:
+        rollup_cube.refresh_cube(final_aggregated_data, partial_days=partial_days)
+
+    # Save the final aggregated DataFrame to a new CSV file
+    if write_csv:
+        final_aggregated_data.to_csv(aggregated_output_path, index=False)
+        print("Final aggregated data saved to aggregated_data.csv")
+
+    return final_aggregated_data
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Aggregate organized_data.csv into aggregated_data.csv')
+    parser.add_argument('--chunk-size', type=int, help='stream the input in chunks of this many rows to bound memory')
+    parser.add_argument('--partial-days', action='store_true', help='add to the rollup cube instead of replacing its days (input from extract --incremental)')
+    args = parser.parse_args()
+    main(chunk_size=args.chunk_size, partial_days=args.partial_days)
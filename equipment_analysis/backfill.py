@@ -0,0 +1,108 @@
+import os
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import pandas as pd
+import extract
+import organize
+import aggregate
+import rollup_cube
+import page_archive
+
+backfill_dir = 'backfill'  # One aggregated CSV per finished partition
+backfill_output_path = os.path.join(backfill_dir, 'backfill_aggregated_data.csv')  # Merged result in date order, out of reach of main.delete_files
+partition_days = {'day': 1, 'week': 7}
+
+# Function to split [start_date, end_date) into day or week partitions
+def build_partitions(start_date, end_date, partition='day'):
+    step = timedelta(days=partition_days[partition])
+    partitions = []
+    partition_start = start_date
+    while partition_start < end_date:
+        partition_end = min(partition_start + step, end_date)
+        partitions.append((partition_start, partition_end))
+        partition_start = partition_end
+    return partitions
+
+def get_partition_path(partition_start, partition_end, output_dir=backfill_dir):
+    return os.path.join(output_dir, f"{partition_start:%Y-%m-%d}_{partition_end:%Y-%m-%d}.csv")
+
+# Function to run extract -> organize -> aggregate for one partition inside a worker process
+def run_partition(partition_start, partition_end, group_map, lock, shared_state, output_dir=backfill_dir, archive_pages=False):
+    # Every worker draws from the same Zendesk request budget
+    rate_limiter = extract.RateLimiter(extract.requests_per_minute, lock, shared_state)
+    # Each worker process writes its own archive files
+    archive = page_archive.PageArchive() if archive_pages else None
+    tickets = extract.fetch_tickets_for_date_range(partition_start, partition_end, group_map, write_csv=False,
+                                                   rate_limiter=rate_limiter, raise_errors=True, archive=archive)
+    organized_df = organize.organize_tickets(tickets.to_frame())
+
+    # Aggregate each day on its own, exactly as a daily run would
+    aggregated_df = aggregate.aggregate_days(organized_df)
+
+    # Write to a temporary file first so only complete partitions count as finished
+    partition_path = get_partition_path(partition_start, partition_end, output_dir)
+    temp_path = partition_path + '.tmp'
+    aggregated_df.to_csv(temp_path, index=False)
+    os.replace(temp_path, partition_path)
+    return partition_path
+
+# Function to merge the partition outputs in date order into a single aggregated CSV
+def merge_partitions(partitions, output_path=backfill_output_path, output_dir=backfill_dir):
+    partition_dfs = [pd.read_csv(get_partition_path(partition_start, partition_end, output_dir), keep_default_na=False)
+                     for partition_start, partition_end in partitions]
+    merged_df = pd.concat(partition_dfs, ignore_index=True)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    merged_df.to_csv(output_path, index=False)
+    print(f"Merged {len(partitions)} partitions into {output_path}")
+    return merged_df
+
+# Entry point: rebuild aggregated history for [start_date, end_date), skipping partitions already done
+def run_backfill(start_date, end_date, partition='day', workers=4, output_dir=backfill_dir, output_path=backfill_output_path,
+                 archive_pages=False):
+    os.makedirs(output_dir, exist_ok=True)
+    partitions = build_partitions(start_date, end_date, partition)
+    pending = [(partition_start, partition_end) for partition_start, partition_end in partitions
+               if not os.path.exists(get_partition_path(partition_start, partition_end, output_dir))]
+    print(f"{len(partitions) - len(pending)} of {len(partitions)} partitions already done, {len(pending)} to run")
+
+    failed = []
+    if pending:
+        group_map = extract.load_group_map()
+
+        with multiprocessing.Manager() as manager:
+            lock = manager.Lock()
+            shared_state = manager.dict(next_slot=0.0, blocked_until=0.0)
+
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(run_partition, partition_start, partition_end, group_map, lock, shared_state, output_dir, archive_pages): (partition_start, partition_end)
+                           for partition_start, partition_end in pending}
+
+                for future in as_completed(futures):
+                    partition_start, partition_end = futures[future]
+                    try:
+                        print(f"Finished partition {partition_start:%Y-%m-%d} to {partition_end:%Y-%m-%d}: {future.result()}")
+                    except Exception as e:
+                        print(f"Partition {partition_start:%Y-%m-%d} to {partition_end:%Y-%m-%d} failed: {e}")
+                        failed.append((partition_start, partition_end))
+
+    if failed:
+        print(f"{len(failed)} partitions failed. Run the backfill again to retry only those partitions.")
+        return None
+
+    merged_df = merge_partitions(partitions, output_path, output_dir)
+    if aggregate.update_rollup_cube:
+        rollup_cube.refresh_cube(merged_df)
+    return merged_df
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rebuild aggregated ticket history for a date range')
+    parser.add_argument('start_date', help='first day to rebuild (YYYY-MM-DD)')
+    parser.add_argument('end_date', help='day after the last day to rebuild (YYYY-MM-DD)')
+    parser.add_argument('--partition', choices=sorted(partition_days), default='day', help='size of each partition')
+    parser.add_argument('--workers', type=int, default=4, help='number of worker processes')
+    parser.add_argument('--archive-pages', action='store_true', help='keep every raw search page in page_archive/ for offline replay')
+    args = parser.parse_args()
+    run_backfill(datetime.strptime(args.start_date, '%Y-%m-%d'), datetime.strptime(args.end_date, '%Y-%m-%d'), args.partition, args.workers,
+                 archive_pages=args.archive_pages)
@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import subprocess
+import tempfile
+from datetime import datetime, timedelta
+import pandas as pd
+import extract
+import organize
+import aggregate
+import convert
+import upload
+import synthetic_zendesk
+from classification_cache import ClassificationCache
+
+benchmark_results_path = 'benchmark_results.json'  # Every run is appended, keyed by code version
+default_sizes = [1000, 100000, 1000000]
+generate_batch_size = 100000  # Raw tickets are generated and processed in batches to bound memory
+fetch_size_limit = 100000  # Fetching through the local stand-in is skipped above this size
+parity_sample_size = 5000  # Distinct subjects checked against the reference classifiers
+regression_threshold = 1.25  # Flag timings more than 25% slower than the previous version
+benchmark_days = 30  # Synthetic tickets are spread over this many days
+
+# Function to identify the code being measured
+def get_code_version():
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                  cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+        dirty = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], capture_output=True, text=True,
+                               cwd=os.path.dirname(os.path.abspath(__file__)), check=True).stdout.strip()
+        return revision + ('-dirty' if dirty else '')
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+def timed(function, *args, **kwargs):
+    started = time.perf_counter()
+    result = function(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+# Function to check the compiled classifiers against determine_category/determine_status,
+# uncached and through a fresh classification cache, once filling it and once answering from it
+def check_classifier_parity(subjects):
+    sample = pd.Series(subjects).dropna().drop_duplicates().head(parity_sample_size).reset_index(drop=True)
+    expected = [(organize.determine_category(subject), organize.determine_status(subject)) for subject in sample]
+    for subject, labels in zip(sample, expected):
+        actual = organize.classify_subject(subject)
+        if actual != labels:
+            raise AssertionError(f"Classifier mismatch for {subject!r}: expected {labels}, got {actual}")
+
+    cache_dir = tempfile.mkdtemp(prefix='equipment_benchmark_')
+    cache = ClassificationCache(organize.keyword_tables_hash, os.path.join(cache_dir, 'classification_cache.sqlite'))
+    try:
+        for cache_pass in ('filling', 'reading'):
+            categories, statuses = organize.classify_subjects(sample, cache)
+            for subject, labels, actual in zip(sample, expected, zip(categories, statuses)):
+                if actual != labels:
+                    raise AssertionError(f"Cached classifier mismatch ({cache_pass} the cache) for {subject!r}: expected {labels}, got {actual}")
+    finally:
+        cache.close()
+        shutil.rmtree(cache_dir)
+    return len(sample)
+
+# Function to time extract.process_tickets over synthetic raw tickets, batch by batch
+def benchmark_process_tickets(size, start_date, end_date, group_map):
+    extracted_rows = extract.TicketBatch()
+    seconds = 0.0
+    for first in range(0, size, generate_batch_size):
+        raw_tickets = synthetic_zendesk.generate_tickets(min(generate_batch_size, size - first), start_date, end_date,
+                                                         seed=first, first_id=first + 1)
+        processed, batch_seconds = timed(extract.process_tickets, raw_tickets, group_map)
+        extracted_rows.extend(processed)
+        seconds += batch_seconds
+    return extracted_rows.to_frame(), seconds
+
+# Function to time a full fetch through the local stand-in, with injected 429s
+def benchmark_fetch(size, start_date, end_date, rate_limit_every):
+    tickets = synthetic_zendesk.generate_tickets(size, start_date, end_date, seed=size)
+    original_base_url = extract.base_url
+    with synthetic_zendesk.ZendeskStandIn(tickets, rate_limit_every=rate_limit_every) as stand_in:
+        extract.base_url = stand_in.base_url
+        try:
+            group_map = extract.fetch_groups()
+            # The stand-in is local, so the request budget is not the bottleneck being measured
+            rate_limiter = extract.RateLimiter(1000000)
+            fetched, seconds = timed(extract.fetch_tickets_for_date_range, start_date, end_date, group_map,
+                                     write_csv=False, rate_limiter=rate_limiter, raise_errors=True)
+        finally:
+            extract.base_url = original_base_url
+    expected = sum(1 for ticket in tickets if extract.filter_ticket(ticket, group_map))
+    if len(fetched) != expected:
+        raise AssertionError(f"Fetched {len(fetched)} tickets through the stand-in, expected {expected}")
+    print(f"Stand-in served {stand_in.request_count} requests, {stand_in.rate_limited_count} of them 429s")
+    return seconds
+
+# Function to time the upload append into a fresh workbook and a re-run against the same workbook
+def benchmark_upload(aggregated_df):
+    columns, rows = convert.to_rows(aggregated_df)
+    workbook_dir = tempfile.mkdtemp(prefix='equipment_benchmark_')
+    try:
+        workbook_path = os.path.join(workbook_dir, 'benchmark.xlsx')
+        _, new_seconds = timed(upload.append_to_partition, workbook_path, 'Sheet1', columns, rows)
+        _, rerun_seconds = timed(upload.append_to_partition, workbook_path, 'Sheet1', columns, rows)
+    finally:
+        shutil.rmtree(workbook_dir)
+    return new_seconds, rerun_seconds
+
+# Function to run every benchmark for one ticket count
+def run_size(size, rate_limit_every):
+    end_date = datetime(2024, 1, 1)
+    start_date = end_date - timedelta(days=benchmark_days)
+    group_map = dict(synthetic_zendesk.synthetic_groups)
+    timings = {}
+
+    extracted_df, timings['process_tickets'] = benchmark_process_tickets(size, start_date, end_date, group_map)
+    parity_checked = check_classifier_parity(extracted_df['Ticket subject'])
+    print(f"Classifier parity holds for {parity_checked} distinct subjects")
+
+    organized_df, timings['organize_tickets'] = timed(organize.organize_tickets, extracted_df)
+    _, timings['classify_subjects'] = timed(organize.classify_subjects, extracted_df['Ticket subject'])
+    aggregated_df, timings['aggregate_tickets'] = timed(aggregate.aggregate_tickets, organized_df)
+    timings['upload_append_new'], timings['upload_append_rerun'] = benchmark_upload(aggregated_df)
+
+    if size <= fetch_size_limit:
+        timings['fetch_stand_in'] = benchmark_fetch(size, start_date, end_date, rate_limit_every)
+    else:
+        print(f"Skipping the stand-in fetch for {size} tickets (limit {fetch_size_limit})")
+
+    return {'timings': timings, 'extracted_rows': len(extracted_df), 'aggregated_rows': len(aggregated_df)}
+
+def load_results(path=benchmark_results_path):
+    if not os.path.exists(path):
+        return []
+    with open(path, 'r', encoding='utf-8') as results_file:
+        return json.load(results_file)
+
+def save_results(runs, path=benchmark_results_path):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as results_file:
+        json.dump(runs, results_file, indent=2)
+    os.replace(temp_path, path)
+
+# Function to compare a run against the latest run of a different code version
+def report_regressions(run, previous_runs):
+    baseline = next((previous for previous in reversed(previous_runs) if previous['version'] != run['version']), None)
+    if baseline is None:
+        print("No earlier version to compare against.")
+        return []
+
+    regressions = []
+    print(f"Compared with {baseline['version']} ({baseline['finished_at']}):")
+    for size, result in run['sizes'].items():
+        baseline_timings = baseline['sizes'].get(size, {}).get('timings', {})
+        for name, seconds in result['timings'].items():
+            if not baseline_timings.get(name):
+                continue
+            ratio = seconds / baseline_timings[name]
+            flag = ''
+            if ratio > regression_threshold:
+                flag = '  <-- regression'
+                regressions.append((size, name, ratio))
+            print(f"  {size:>8} {name:<20} {seconds:10.3f}s  x{ratio:.2f}{flag}")
+    return regressions
+
+# Entry point: run the benchmarks, store the results and report regressions against the previous version
+def main(sizes=default_sizes, rate_limit_every=10, results_path=benchmark_results_path):
+    run = {
+        'version': get_code_version(),
+        'finished_at': None,
+        'python': platform.python_version(),
+        'pandas': pd.__version__,
+        'sizes': {}
+    }
+    for size in sizes:
+        print(f"Benchmarking {size} tickets...")
+        run['sizes'][str(size)] = run_size(size, rate_limit_every)
+        for name, seconds in run['sizes'][str(size)]['timings'].items():
+            print(f"  {name:<20} {seconds:10.3f}s")
+    run['finished_at'] = datetime.utcnow().isoformat() + 'Z'
+
+    previous_runs = load_results(results_path)
+    regressions = report_regressions(run, previous_runs)
+    save_results(previous_runs + [run], results_path)
+    print(f"Benchmark results saved to {results_path}")
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the pipeline against synthetic tickets and a local Zendesk stand-in')
+    parser.add_argument('--sizes', type=int, nargs='+', default=default_sizes, help='ticket counts to benchmark')
+    parser.add_argument('--rate-limit-every', type=int, default=10, help='answer every Nth stand-in request with a 429 (0 disables)')
+    parser.add_argument('--results', default=benchmark_results_path, help='JSON file the results are appended to')
+    args = parser.parse_args()
+    if main(args.sizes, args.rate_limit_every, args.results):
+        sys.exit(1)
@@ -0,0 +1,90 @@
+import sqlite3
+import hashlib
+import json
+from collections import OrderedDict
+
+cache_db_path = 'classification_cache.sqlite'  # On-disk store shared by daily runs
+memory_cache_size = 10000  # Maximum number of subjects kept in memory
+query_chunk_size = 500  # Keys per SQLite lookup, below the bound-parameter limit
+
+# ASCII upper case -> lower case, the only case folding that cannot change an IGNORECASE match
+ascii_lowercase_table = str.maketrans('ABCDEFGHIJKLMNOPQRSTUVWXYZ', 'abcdefghijklmnopqrstuvwxyz')
+
+# Function to normalize a ticket subject into a cache key. Only differences the keyword search cannot see are dropped
+# (ASCII case and surrounding whitespace), so every subject with the same key classifies the same. Inner whitespace
+# and non-ASCII case are kept: 'desk  top' does not match 'desk top', and full Unicode case folding turns 'ß' into 'ss'.
+def normalize_subject(ticket_subject):
+    return ticket_subject.strip().translate(ascii_lowercase_table)
+
+# Function to fingerprint keyword tables; any edit to a table changes the hash
+def hash_keyword_tables(*keyword_tables):
+    return hashlib.sha256(json.dumps(keyword_tables).encode('utf-8')).hexdigest()
+
+# Two-level (category, status) cache: a bounded LRU in memory in front of a SQLite table
+class ClassificationCache:
+    def __init__(self, tables_hash, db_path=cache_db_path, max_entries=memory_cache_size):
+        self.max_entries = max_entries
+        self.memory = OrderedDict()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS classifications (subject_key TEXT PRIMARY KEY, category TEXT, status TEXT)')
+
+        # Drop every stored entry when the keyword tables changed since they were cached
+        row = self.connection.execute("SELECT value FROM meta WHERE key = 'tables_hash'").fetchone()
+        if row is None or row[0] != tables_hash:
+            if row is not None:
+                print("Keyword tables changed, clearing the classification cache")
+            self.connection.execute('DELETE FROM classifications')
+            self.connection.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('tables_hash', ?)", (tables_hash,))
+        self.connection.commit()
+
+    def remember(self, key, value):
+        self.memory[key] = value
+        self.memory.move_to_end(key)
+        if len(self.memory) > self.max_entries:
+            self.memory.popitem(last=False)
+
+    # Function to look up many keys at once; returns {key: (category, status)} for the known ones
+    def get_many(self, keys):
+        found = {}
+        disk_keys = []
+        disk_found = 0
+        for key in keys:
+            if key in self.memory:
+                self.memory.move_to_end(key)
+                found[key] = self.memory[key]
+                self.memory_hits += 1
+            else:
+                disk_keys.append(key)
+
+        for start in range(0, len(disk_keys), query_chunk_size):
+            chunk = disk_keys[start:start + query_chunk_size]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self.connection.execute(
+                f'SELECT subject_key, category, status FROM classifications WHERE subject_key IN ({placeholders})', chunk)
+            for key, category, status in rows:
+                found[key] = (category, status)
+                self.remember(key, (category, status))
+                self.disk_hits += 1
+                disk_found += 1
+
+        self.misses += len(disk_keys) - disk_found
+        return found
+
+    # Function to store newly classified keys in memory and on disk
+    def put_many(self, classifications):
+        for key, value in classifications.items():
+            self.remember(key, value)
+        self.connection.executemany('INSERT OR REPLACE INTO classifications (subject_key, category, status) VALUES (?, ?, ?)',
+                                    [(key, category, status) for key, (category, status) in classifications.items()])
+        self.connection.commit()
+
+    def report(self):
+        print(f"Classification cache: {self.memory_hits} memory hits, {self.disk_hits} disk hits, {self.misses} misses")
+
+    def close(self):
+        self.connection.close()
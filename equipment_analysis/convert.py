@@ -1,13 +1,39 @@
 import pandas as pd
+import openpyxl  # For writing Excel files
 
-# Load the CSV file
+# Input and output files
 csv_file = 'aggregated_data.csv'  # Replace with your CSV file path
 xlsx_file = 'aggregated_data.xlsx'  # Replace with desired output file path
 
-# Read the CSV file into a DataFrame
-df = pd.read_csv(csv_file)
+# Function to turn a DataFrame into a header and plain Python rows; blank and missing cells become None
+def to_rows(df):
+    rows = [[None if (isinstance(value, str) and value == '') or pd.isna(value) else value for value in row]
+            for row in df.values.tolist()]
+    return list(df.columns), rows
 
-# Write the DataFrame to an Excel file
-df.to_excel(xlsx_file, index=False, engine='openpyxl')
+# Function to write rows with openpyxl's write-only workbook, which streams rows to disk
+def write_xlsx(columns, rows, path=xlsx_file):
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet('Sheet1')
+    sheet.append(columns)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
 
-print(f"CSV file has been successfully converted to {xlsx_file}")
+# Entry point: write a DataFrame (or aggregated_data.csv) to aggregated_data.xlsx and return its rows for upload
+def main(df=None, write_xlsx_file=True):
+    # Read the CSV file into a DataFrame when no DataFrame is handed over
+    if df is None:
+        df = pd.read_csv(csv_file)
+
+    columns, rows = to_rows(df)
+
+    # Write the rows to an Excel file
+    if write_xlsx_file:
+        write_xlsx(columns, rows, xlsx_file)
+        print(f"Aggregated data has been successfully written to {xlsx_file}")
+
+    return columns, rows
+
+if __name__ == "__main__":
+    main()
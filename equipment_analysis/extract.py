@@ -1,19 +1,27 @@
 import sys 
-import io
+import os
+import json
+import argparse
 import requests
 import pandas as pd
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
 import time
 import re
+import threading
+import functools
+from concurrent.futures import ThreadPoolExecutor
+import metrics
 from project_config import zendesk_api_token, zendesk_api_url, zendesk_email, zendesk_subdomain, product_service_desk_tool_id, action_taken_id  
 
-# Set the standard output to use utf-8 encoding
-sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding='utf-8')
+# Set the standard output to use utf-8 encoding (in place, so importing this module twice is harmless)
+if hasattr(sys.stdout, 'reconfigure'):
+    sys.stdout.reconfigure(encoding='utf-8')
 
 # Zendesk credentials and details
 subdomain = zendesk_subdomain
 email = f'{zendesk_email}/token'
 api_token = zendesk_api_token
+base_url = f'https://{subdomain}.zendesk.com'
 
 # List of allowed group names
 allowed_group_names = {
@@ -21,148 +29,632 @@ allowed_group_names = {
     'Equipment Waiting'
 }
 
+# Columns written to extracted_data.csv
+extracted_columns = [
+    'Product - Service Desk Tool',
+    'Action Taken',
+    'Ticket group',
+    'Ticket subject',
+    'Ticket created - Day of month',
+    'Ticket created - Month',
+    'Ticket created - Year',
+    'Tickets',
+    'Ticket solved - Date',
+    'Reopens',
+    'Full resolution time (minutes)'
+]
+
 tickets = []
 batch_size = 300  # Fetch 500 tickets at a time
-pause_duration = 15  # Pause for 15 seconds after each batch
+pause_duration = 15  # Fallback pause when a 429 response carries no Retry-After header
+slice_hours = 1  # Width of each created>/created< search window
+max_workers = 4  # Number of search windows fetched concurrently
+requests_per_minute = 100  # Search API budget shared by all workers
+max_search_results = 1000  # Zendesk search stops paginating after this many results
+state_file_path = 'extract_state.json'  # Checkpoint for incremental mode
+pending_state_path = 'extract_state.pending.json'  # Checkpoint staged by the current run, committed once the run succeeded
+incremental_requests_per_minute = 10  # Incremental export endpoints allow 10 requests per minute
+incremental_retention_days = 7  # How long emitted tickets are remembered for deduplication and change tracking
+show_many_batch_size = 100  # Ticket IDs per show_many request, the endpoint's maximum
+group_cache_path = 'group_cache.json'  # Group ID -> name map shared by daily runs
+group_cache_ttl_hours = 24  # Refetch the groups once the cached map is older than this
 
-# Function to fetch groups from Zendesk
-def fetch_groups():
-    url = f'https://{subdomain}.zendesk.com/api/v2/groups.json'
-    response = requests.get(url, auth=(email, api_token))
-    
-    if response.status_code != 200:
-        print(f"Error fetching groups: {response.status_code}")
-        return {}
+# Column-oriented batch of processed tickets: one list per column instead of one dict per ticket.
+# Batches concatenate with extend and become a DataFrame without building any per-row objects.
+class TicketBatch:
+    columns = ['Ticket ID'] + extracted_columns  # 'Ticket ID' keys deduplication and the ticket store, it is not written to CSV
 
-    group_data = response.json()
-    group_map = {group['id']: group['name'] for group in group_data['groups']}
+    def __init__(self, data=None):
+        self.data = data if data is not None else {column: [] for column in self.columns}
 
-    # Print all available group names
-    print("Available Groups:")
-    for group_name in group_map.values():
-        print(group_name)
+    def __len__(self):
+        return len(self.data['Ticket ID'])
 
-    return group_map
+    def extend(self, other):
+        for column, values in other.data.items():
+            self.data[column].extend(values)
+
+    # Function to build a new batch from the tickets at the given positions, in that order
+    def take(self, positions):
+        return TicketBatch({column: [values[position] for position in positions] for column, values in self.data.items()})
+
+    def row(self, position):
+        return {column: values[position] for column, values in self.data.items()}
+
+    # Function to iterate over tuples of the given columns, e.g. for executemany
+    def rows(self, columns):
+        return zip(*(self.data[column] for column in columns))
+
+    # Function to build the extracted DataFrame from the tickets at position start onwards
+    def to_frame(self, start=0):
+        return pd.DataFrame({column: self.data[column][start:] for column in extracted_columns}, columns=extracted_columns)
+
+# Shared request budget for every worker thread.
+# Pass a multiprocessing.Manager lock and dict to share the budget between processes as well.
+class RateLimiter:
+    def __init__(self, requests_per_minute, lock=None, shared_state=None):
+        self.interval = 60.0 / requests_per_minute
+        self.lock = lock if lock is not None else threading.Lock()
+        self.state = shared_state if shared_state is not None else {'next_slot': 0.0, 'blocked_until': 0.0}
+
+    # Block until the next request slot is free
+    def wait(self):
+        with self.lock:
+            slot = max(time.time(), self.state['next_slot'], self.state['blocked_until'])
+            self.state['next_slot'] = slot + self.interval
+        delay = slot - time.time()
+        if delay > 0:
+            time.sleep(delay)
+
+    # Hold back every worker for the given number of seconds
+    def block(self, seconds):
+        with self.lock:
+            self.state['blocked_until'] = max(self.state['blocked_until'], time.time() + seconds)
+
+# Function to build the settings of one Zendesk tenant: where to fetch, as whom, and which groups and fields to read.
+# Every fetch function takes an optional profile and falls back to the project_config tenant without one.
+def build_profile(name, subdomain, email, api_token, allowed_group_names=allowed_group_names,
+                  product_service_desk_tool_id=product_service_desk_tool_id, action_taken_id=action_taken_id,
+                  requests_per_minute=requests_per_minute, group_cache_path=group_cache_path):
+    return {
+        'name': name,
+        'base_url': f'https://{subdomain}.zendesk.com',
+        'auth': (f'{email}/token', api_token),
+        'allowed_group_names': set(allowed_group_names),
+        'product_service_desk_tool_id': product_service_desk_tool_id,
+        'action_taken_id': action_taken_id,
+        'requests_per_minute': requests_per_minute,
+        'group_cache_path': group_cache_path
+    }
+
+# Function to get the project_config tenant, read at call time so a changed base_url (e.g. the benchmark stand-in) applies
+def get_default_profile():
+    return {
+        'name': 'default',
+        'base_url': base_url,
+        'auth': (email, api_token),
+        'allowed_group_names': allowed_group_names,
+        'product_service_desk_tool_id': product_service_desk_tool_id,
+        'action_taken_id': action_taken_id,
+        'requests_per_minute': requests_per_minute,
+        'group_cache_path': group_cache_path
+    }
+
+# Raised instead of returning partial results when a caller needs all-or-nothing fetches
+class ZendeskAPIError(Exception):
+    pass
+
+# One HTTP session (and connection pool) per worker thread and tenant
+thread_state = threading.local()
+
+def get_session(profile=None):
+    auth = (profile or get_default_profile())['auth']
+    if not hasattr(thread_state, 'sessions'):
+        thread_state.sessions = {}
+    if auth not in thread_state.sessions:
+        session = requests.Session()
+        session.auth = auth
+        thread_state.sessions[auth] = session
+    return thread_state.sessions[auth]
+
+# Function to read the Retry-After header of a 429 response
+def get_retry_after(response):
+    try:
+        return max(float(response.headers.get('Retry-After', pause_duration)), 0)
+    except ValueError:
+        return pause_duration
+
+# Function to GET a URL within the shared rate limit, retrying on 429
+def get_with_rate_limit(url, rate_limiter, profile=None):
+    while True:
+        rate_limiter.wait()
+        response = get_session(profile).get(url)
+        metrics.record_request(response.status_code)
 
-# Function to fetch tickets within a date range
-def fetch_tickets_for_date_range(start_date, end_date, group_map):
-    url = f'https://{subdomain}.zendesk.com/api/v2/search.json?query=type:ticket created>{start_date} created<{end_date}&per_page={batch_size}'
-    tickets_fetched = []
-    
-    while url:
-        response = requests.get(url, auth=(email, api_token))
-        
         if response.status_code == 429:  # Rate limit hit
-            print("Rate limit exceeded. Pausing for longer duration...")
-            time.sleep(pause_duration)
+            retry_after = get_retry_after(response)
+            print(f"Rate limit exceeded. Retrying after {retry_after} seconds...")
+            metrics.record_retry_wait(retry_after)
+            rate_limiter.block(retry_after)
             continue  # Retry the request after the pause
 
+        return response
+
+# Function to fetch every page of groups from Zendesk; returns None when a page fails
+def fetch_groups(profile=None):
+    profile = profile or get_default_profile()
+    url = f"{profile['base_url']}/api/v2/groups.json"
+    rate_limiter = RateLimiter(profile['requests_per_minute'])
+    group_map = {}
+
+    while url:
+        response = get_with_rate_limit(url, rate_limiter, profile)
+
+        if response.status_code != 200:
+            print(f"Error fetching groups: {response.status_code}")
+            return None  # A partial map would silently drop tickets of the missing groups
+
+        group_data = response.json()
+        group_map.update({group['id']: group['name'] for group in group_data['groups']})
+        url = group_data.get('next_page')
+
+    print(f"Fetched {len(group_map)} groups")
+    return group_map
+
+# Function to load the cached group map; returns (fetched_at, group_map) or (None, None) without a usable cache
+def load_group_cache(cache_path=group_cache_path):
+    if not os.path.exists(cache_path):
+        return None, None
+    try:
+        with open(cache_path, 'r', encoding='utf-8') as cache_file:
+            cache = json.load(cache_file)
+        # JSON object keys are strings, Zendesk group IDs are integers
+        return datetime.fromisoformat(cache['fetched_at']), {int(group_id): name for group_id, name in cache['groups'].items()}
+    except (ValueError, KeyError) as e:
+        print(f"Ignoring unreadable group cache {cache_path}: {e}")
+        return None, None
+
+# Function to write the group cache atomically
+def save_group_cache(group_map, cache_path=group_cache_path):
+    temp_path = cache_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as cache_file:
+        json.dump({'fetched_at': datetime.utcnow().isoformat(), 'groups': group_map}, cache_file)
+    os.replace(temp_path, cache_path)
+
+# Function to get the group map from the cache, refetching every page once it is older than the TTL
+def load_group_map(refresh=False, ttl_hours=group_cache_ttl_hours, profile=None):
+    profile = profile or get_default_profile()
+    fetched_at, cached_map = load_group_cache(profile['group_cache_path'])
+    if not refresh and cached_map is not None and datetime.utcnow() - fetched_at < timedelta(hours=ttl_hours):
+        print(f"Using {len(cached_map)} cached groups from {fetched_at:%Y-%m-%d %H:%M} UTC")
+        return cached_map
+
+    group_map = fetch_groups(profile)
+    if group_map is None:
+        if cached_map is not None:
+            print(f"Falling back to the cached groups from {fetched_at:%Y-%m-%d %H:%M} UTC")
+            return cached_map
+        return {}
+
+    save_group_cache(group_map, profile['group_cache_path'])
+    return group_map
+
+# Function to resolve allowed_group_names to group IDs, so searches only return equipment tickets
+def get_allowed_group_ids(group_map, allowed_names=None):
+    allowed_names = allowed_group_names if allowed_names is None else allowed_names
+    group_ids = sorted(group_id for group_id, group_name in group_map.items() if group_name in allowed_names)
+    missing_names = allowed_names - {group_map[group_id] for group_id in group_ids}
+    if missing_names:
+        print(f"Allowed groups not found in Zendesk: {', '.join(sorted(missing_names))}")
+    return group_ids
+
+# Function to split a date range into consecutive search windows
+def build_time_slices(start_date, end_date, hours=slice_hours):
+    slices = []
+    slice_start = start_date
+    while slice_start < end_date:
+        slice_end = min(slice_start + timedelta(hours=hours), end_date)
+        slices.append((slice_start, slice_end))
+        slice_start = slice_end
+    return slices
+
+def format_search_time(value):
+    return value.strftime('%Y-%m-%dT%H:%M:%SZ')
+
+# Function to build the search URL for tickets created in [slice_start, slice_end), limited to the given groups
+def build_search_url(slice_start, slice_end, group_ids=(), profile=None):
+    # created> is exclusive, so step back one second to keep the window start inclusive
+    query = f'type:ticket created>{format_search_time(slice_start - timedelta(seconds=1))} created<{format_search_time(slice_end)}'
+    # Repeated group: terms match tickets in any of the groups
+    query += ''.join(f' group:{group_id}' for group_id in group_ids)
+    return f"{(profile or get_default_profile())['base_url']}/api/v2/search.json?query={query}&sort_by=created_at&sort_order=asc&per_page={batch_size}"
+
+# Function to fetch the metric sets (solved time, reopens, resolution time) of many tickets,
+# sideloaded on show_many so it costs one request per 100 tickets instead of one per ticket
+def fetch_metric_sets(ticket_ids, rate_limiter, raise_errors=False, profile=None):
+    profile = profile or get_default_profile()
+    metric_sets = {}
+    for start in range(0, len(ticket_ids), show_many_batch_size):
+        ids = ','.join(str(ticket_id) for ticket_id in ticket_ids[start:start + show_many_batch_size])
+        response = get_with_rate_limit(f"{profile['base_url']}/api/v2/tickets/show_many.json?ids={ids}&include=metric_sets", rate_limiter, profile)
+
         if response.status_code != 200:
+            print(f"Error fetching ticket metrics: {response.status_code}")
+            if raise_errors:
+                raise ZendeskAPIError(f"show_many failed with status {response.status_code}")
+            continue  # These tickets keep empty solved and metric columns
+
+        for metric_set in response.json().get('metric_sets', []):
+            metric_sets[metric_set['ticket_id']] = metric_set
+    return metric_sets
+
+# Function to fetch every page of a single search window. With on_batch, each page's tickets are handed to
+# on_batch((slice_start, page_number), batch) as soon as they are processed instead of being returned.
+# With an archive (page_archive.PageArchive), every raw page is also written to it with its metric sets.
+def fetch_time_slice(slice_start, slice_end, group_map, rate_limiter, raise_errors=False, group_ids=(), profile=None, on_batch=None,
+                     archive=None):
+    profile = profile or get_default_profile()
+    url = build_search_url(slice_start, slice_end, group_ids, profile)
+    tickets_fetched = TicketBatch()
+    first_page = True
+    page_number = 0
+
+    while url:
+        page_started = time.perf_counter()
+        response = get_with_rate_limit(url, rate_limiter, profile)
+
+        if response.status_code != 200:
+            metrics.record_page(f"search {slice_start} - {slice_end}", response.status_code, 0, time.perf_counter() - page_started)
             print(f"Error: {response.status_code}")
-            print(response.json())
+            print(response.text)
+            if raise_errors:
+                raise ZendeskAPIError(f"Search between {slice_start} and {slice_end} failed with status {response.status_code}")
             return tickets_fetched  # Return whatever we have fetched so far
 
         data = response.json()
+
+        # Split windows that exceed the search result cap so no tickets are dropped
+        if first_page and data.get('count', 0) > max_search_results and slice_end - slice_start > timedelta(minutes=1):
+            midpoint = slice_start + timedelta(seconds=int((slice_end - slice_start).total_seconds() // 2))
+            print(f"{data['count']} results between {slice_start} and {slice_end}, splitting the window at {midpoint}")
+            tickets_fetched = fetch_time_slice(slice_start, midpoint, group_map, rate_limiter, raise_errors, group_ids, profile, on_batch, archive)
+            tickets_fetched.extend(fetch_time_slice(midpoint, slice_end, group_map, rate_limiter, raise_errors, group_ids, profile, on_batch, archive))
+            return tickets_fetched
+        first_page = False
+
         tickets_data = data.get('results', [])
-        tickets_fetched.extend(process_tickets(tickets_data, group_map))
+        equipment_ids = [ticket['id'] for ticket in tickets_data if filter_ticket(ticket, group_map, profile['allowed_group_names'])]
+        metric_sets = fetch_metric_sets(equipment_ids, rate_limiter, raise_errors, profile)
+        if archive is not None:
+            archive.append_page(slice_start, slice_end, page_number, data, metric_sets)
+        page_tickets = process_tickets(tickets_data, group_map, metric_sets, profile)
+        metrics.record_page(f"search {slice_start} - {slice_end}", response.status_code, len(tickets_data), time.perf_counter() - page_started)
+        if on_batch is not None:
+            # Keys sort pages chronologically, also across split windows
+            on_batch((slice_start, page_number), page_tickets)
+        else:
+            tickets_fetched.extend(page_tickets)
+        page_number += 1
         url = data.get('next_page')  # Get the next page URL
 
-        if len(tickets_fetched) >= 500:
-            save_tickets_to_csv(tickets_fetched)
-            tickets_fetched.clear()
-            time.sleep(pause_duration)  # Pause after every 500 tickets
+    return tickets_fetched
+
+# Function to fetch tickets within a date range. Pass an executor to run the windows on a pool shared with
+# other callers (e.g. other tenants); its threads keep one session per tenant. Pass on_batch to receive every
+# page as it arrives (see fetch_time_slice); the returned batch is then empty. Pass an archive to keep the raw pages.
+# Repeated tickets are dropped before the batch is returned or written to extracted_data.csv.
+def fetch_tickets_for_date_range(start_date, end_date, group_map, write_csv=True, rate_limiter=None, raise_errors=False,
+                                 profile=None, executor=None, on_batch=None, archive=None):
+    profile = profile or get_default_profile()
+    slices = build_time_slices(start_date, end_date)
+    if rate_limiter is None:
+        rate_limiter = RateLimiter(profile['requests_per_minute'])
+    # Without any allowed group ID, search unfiltered and let filter_ticket decide as before
+    group_ids = get_allowed_group_ids(group_map, profile['allowed_group_names'])
+    tickets_fetched = TicketBatch()
+    if archive is not None:
+        archive.save_groups(group_map)
+
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    try:
+        futures = [executor.submit(fetch_time_slice, slice_start, slice_end, group_map, rate_limiter, raise_errors, group_ids, profile, on_batch, archive)
+                   for slice_start, slice_end in slices]
+
+        # Merge the windows in chronological order, whatever order they finish in
+        for future in futures:
+            tickets_fetched.extend(future.result())
+    finally:
+        if own_executor:
+            executor.shutdown()
+
+    # A ticket can come back twice (a page served again after a retry, a ticket updated between pages),
+    # so drop the repeats before anything reads the batch or the CSV
+    tickets_fetched = dedupe_tickets(tickets_fetched)
+    if write_csv:
+        save_tickets_to_csv(tickets_fetched, mode='w')
 
     return tickets_fetched
 
-def save_tickets_to_csv(tickets_batch):
-    if tickets_batch:
-        df = pd.DataFrame(tickets_batch)
+# Function to load the incremental checkpoint, if any
+def load_state():
+    if not os.path.exists(state_file_path):
+        return {}
+    with open(state_file_path, 'r', encoding='utf-8') as state_file:
+        return json.load(state_file)
+
+# Function to write the incremental checkpoint (or the staged one) atomically
+def save_state(state, path=state_file_path):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+    os.replace(temp_path, path)
+
+# Function to commit the checkpoint staged by the last incremental export. Until then the next run resumes from
+# the previous checkpoint, so the tickets of a run that failed before delivering them are exported again.
+def commit_state():
+    if os.path.exists(pending_state_path):
+        os.replace(pending_state_path, state_file_path)
+
+# Function to read a remembered ticket as [created_at, updated_at, solved counted]. Checkpoints written before
+# changes were tracked only hold created_at, so their tickets count as changed the next time they are exported.
+def read_emitted(entry):
+    return entry if isinstance(entry, list) else [entry, '', False]
+
+# Function to check whether an exported ticket is 'new', 'changed' since it was last emitted, or None to skip it
+def classify_export_ticket(ticket, state):
+    if ticket.get('status') == 'deleted' or ticket.get('created_at', '') < state['created_floor']:
+        return None
+    entry = state['emitted_ids'].get(str(ticket.get('id')))
+    if entry is None:
+        return 'new'
+    # The export can repeat an update across pages or resumed runs, only a later update is a change
+    return 'changed' if ticket.get('updated_at', '') > read_emitted(entry)[1] else None
+
+# Function to fetch tickets new or changed since the last checkpoint via the incremental export.
+# Returns (tickets, delta): tickets holds the current values of every new or changed ticket, for the ticket store;
+# delta is what an append-only run adds downstream. It holds every new ticket, plus a changed ticket only when it was
+# solved since it was emitted, with Tickets set to 0 so it adds the solve without counting the ticket twice.
+def fetch_incremental_tickets(group_map, start_time, write_csv=True):
+    state = load_state()
+    rate_limiter = RateLimiter(incremental_requests_per_minute)
+    # A checkpoint staged by a run that failed must never be committed by this one
+    if os.path.exists(pending_state_path):
+        os.remove(pending_state_path)
+
+    if state.get('cursor'):
+        print(f"Resuming incremental export from checkpoint (high-water mark {state.get('high_water')})")
+        url = f'{base_url}/api/v2/incremental/tickets/cursor.json?cursor={state["cursor"]}&include=metric_sets'
+
+        # Forget tickets created before the retention window; they will not be written again
+        retention_floor = format_search_time(datetime.utcnow() - timedelta(days=incremental_retention_days))
+        state['created_floor'] = max(state['created_floor'], retention_floor)
+        state['emitted_ids'] = {ticket_id: entry for ticket_id, entry in state['emitted_ids'].items()
+                                if read_emitted(entry)[0] >= state['created_floor']}
+    else:
+        print(f"No checkpoint found, starting incremental export at {start_time}")
+        start_timestamp = int(start_time.replace(tzinfo=timezone.utc).timestamp())
+        url = f'{base_url}/api/v2/incremental/tickets/cursor.json?start_time={start_timestamp}&include=metric_sets'
+        state = {'cursor': None, 'high_water': None, 'created_floor': format_search_time(start_time), 'emitted_ids': {}}
+
+    tickets_fetched = TicketBatch()
+    delta_fetched = TicketBatch()
+    csv_mode = 'w'  # The first page replaces whatever an earlier run left in extracted_data.csv
+
+    while url:
+        page_started = time.perf_counter()
+        response = get_with_rate_limit(url, rate_limiter)
+
+        if response.status_code != 200:
+            metrics.record_page('incremental export', response.status_code, 0, time.perf_counter() - page_started)
+            print(f"Error: {response.status_code}")
+            print(response.text)
+            return tickets_fetched, delta_fetched  # The staged checkpoint still points at the last completed page
+
+        data = response.json()
+        tickets_data = data.get('tickets', [])
+        # Ticket ID -> 'new' or 'changed'; a ticket repeated on the page keeps its last copy
+        kinds = {}
+        emitted_by_id = {}
+        for ticket in tickets_data:
+            kind = classify_export_ticket(ticket, state) if filter_ticket(ticket, group_map) else None
+            if kind is not None:
+                kinds[ticket['id']] = kind
+                emitted_by_id[ticket['id']] = ticket
+        emitted_tickets = list(emitted_by_id.values())
+        # Metric sets are sideloaded on the same page, so they cost no extra requests
+        metric_sets = {metric_set['ticket_id']: metric_set for metric_set in data.get('metric_sets', [])}
+        processed_tickets = process_tickets(emitted_tickets, group_map, metric_sets)
+        tickets_fetched.extend(processed_tickets)
+
+        # New tickets go into the delta as they are; changed ones only once, to add their first solve
+        solved_ids = set()
+        delta_positions = []
+        corrections = []
+        for position, (ticket_id, solved_date) in enumerate(processed_tickets.rows(['Ticket ID', 'Ticket solved - Date'])):
+            if solved_date is not None:
+                solved_ids.add(ticket_id)
+            if kinds[ticket_id] == 'new':
+                delta_positions.append(position)
+                corrections.append(False)
+            elif solved_date is not None and not read_emitted(state['emitted_ids'][str(ticket_id)])[2]:
+                delta_positions.append(position)
+                corrections.append(True)
+        page_delta = processed_tickets.take(delta_positions)
+        page_delta.data['Tickets'] = [0 if correction else count for count, correction in zip(page_delta.data['Tickets'], corrections)]
+        delta_fetched.extend(page_delta)
+        if write_csv:
+            save_tickets_to_csv(page_delta, mode=csv_mode)
+            csv_mode = 'a'
+        changed_count = sum(kind == 'changed' for kind in kinds.values())
+        if changed_count:
+            print(f"{changed_count} tickets changed since they were emitted, {sum(corrections)} of them newly solved")
+        metrics.record_page('incremental export', response.status_code, len(tickets_data), time.perf_counter() - page_started)
+
+        # Stage the checkpoint after every page; it is committed once the whole run has succeeded (commit_state)
+        for ticket in emitted_tickets:
+            ticket_id = str(ticket['id'])
+            solved_counted = ticket['id'] in solved_ids or (ticket_id in state['emitted_ids'] and read_emitted(state['emitted_ids'][ticket_id])[2])
+            state['emitted_ids'][ticket_id] = [ticket['created_at'], ticket.get('updated_at', ''), solved_counted]
+        updated_times = [ticket['updated_at'] for ticket in tickets_data if ticket.get('updated_at')]
+        if updated_times:
+            state['high_water'] = max([state['high_water'] or ''] + updated_times)
+        state['cursor'] = data.get('after_cursor') or state['cursor']
+        save_state(state, pending_state_path)
+
+        url = None if data.get('end_of_stream') else data.get('after_url')
+
+    print(f"Incremental export complete, high-water mark {state['high_water']}")
+    return tickets_fetched, delta_fetched
+
+# Function to append the tickets of a batch from position start onwards to extracted_data.csv.
+# mode='w' replaces the file instead, for a batch that holds the whole extract.
+def save_tickets_to_csv(tickets_batch, start=0, mode='a'):
+    if len(tickets_batch) > start:
+        df = tickets_batch.to_frame(start)
         # Ensure the schema has header in the first write
-        df.to_csv('extracted_data.csv', mode='a', index=False, header=not pd.io.common.file_exists('extracted_data.csv'))
-        print(f"Saved {len(tickets_batch)} tickets to extracted_data.csv")
+        df.to_csv('extracted_data.csv', mode=mode, index=False, header=mode == 'w' or not pd.io.common.file_exists('extracted_data.csv'))
+        print(f"Saved {len(df)} tickets to extracted_data.csv")
 
-def filter_ticket(ticket, group_map):
+def filter_ticket(ticket, group_map, allowed_names=None):
     group_id = ticket.get('group_id')
     group_name = group_map.get(group_id, 'Unknown')
 
-    if group_name not in allowed_group_names:
+    if group_name not in (allowed_group_names if allowed_names is None else allowed_names):
         return False
     
     return True
 
-def process_tickets(tickets_data, group_map):
-    filtered_tickets = []
+# Function to read the solved date, reopens and full resolution time from a ticket's metric set
+def read_metric_set(metric_set):
+    if not metric_set:
+        return None, None, None
+    solved_at = metric_set.get('solved_at')
+    resolution_time = metric_set.get('full_resolution_time_in_minutes') or {}
+    return (solved_at[:10] if solved_at else None), metric_set.get('reopens'), resolution_time.get('calendar')
+
+# Function to read day, month and year from a Zendesk timestamp. The format is fixed (YYYY-MM-DDTHH:MM:SSZ), so only
+# the date part is parsed, once per distinct date; anything else goes through strptime and raises on a bad value.
+def parse_created_at(created_at):
+    if len(created_at) == 20 and created_at[10] == 'T' and created_at[19] == 'Z':
+        return parse_created_date(created_at[:10])
+    created_datetime = datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%SZ')
+    return created_datetime.day, created_datetime.month, created_datetime.year
+
+@functools.lru_cache(maxsize=4096)
+def parse_created_date(date_text):
+    created_date = datetime.strptime(date_text, '%Y-%m-%d')
+    return created_date.day, created_date.month, created_date.year
+
+def process_tickets(tickets_data, group_map, metric_sets=None, profile=None):
+    profile = profile or get_default_profile()
+    allowed_names = profile['allowed_group_names']
+    metric_sets = metric_sets or {}
+    batch = TicketBatch()
+    (append_id, append_product, append_action, append_group, append_subject, append_day, append_month, append_year,
+     append_tickets, append_solved, append_reopens, append_resolution) = [batch.data[column].append for column in TicketBatch.columns]
+
+    # Custom field ID -> (position in the found values, default when the field has no value), looked up in constant time
+    field_slots = {profile['action_taken_id']: (1, 'No Action'), profile['product_service_desk_tool_id']: (0, 'No Value')}
 
     for ticket in tickets_data:
-        # Print the entire ticket object for inspection
-        print("\nFull Ticket Data:")
-        print(ticket)  # Print the full ticket to see all fields
+        # Print a sample of full ticket objects for inspection (off by default, see metrics.debug_sample_rate)
+        dump_ticket = metrics.should_dump_ticket()
+        if dump_ticket:
+            print("\nFull Ticket Data:")
+            print(ticket)  # Print the full ticket to see all fields
         
-        if filter_ticket(ticket, group_map):
+        if filter_ticket(ticket, group_map, allowed_names):
             created_at = ticket.get('created_at', ' ')
-            ticket_id = ticket.get('id', ' ')
-            group_id = ticket.get('group_id', ' ')
-            group_name = group_map.get(group_id, 'Unknown')
-            subject = ticket.get('subject', '')
-
-            # Retrieve the product name and action taken from custom fields
-            product_name = None  # Initialize to None if not found
-            action_taken = None  # Initialize to None if not found
-            
-            for custom_field in ticket.get('custom_fields', []):
-                if custom_field['id'] == product_service_desk_tool_id:  # Use the imported variable
-                    product_name = custom_field.get('value', 'No Value')  # Use 'No Value' if field is empty
-                elif custom_field['id'] == action_taken_id:  # Use the imported variable
-                    action_taken = custom_field.get('value', 'No Action')  # Use 'No Action' if field is empty
 
             # Extract day, month, and year from created_at
             try:
-                created_datetime = datetime.strptime(created_at, '%Y-%m-%dT%H:%M:%SZ')
-                created_day = created_datetime.day
-                created_month = created_datetime.month
-                created_year = created_datetime.year  # Extract the year
-                
+                created_day, created_month, created_year = parse_created_at(created_at)
+
                 # Debug prints
-                print(f"Created Date: {created_datetime}, Day: {created_day}, Month: {created_month}, Year: {created_year}")
-                
+                if dump_ticket:
+                    print(f"Created At: {created_at}, Day: {created_day}, Month: {created_month}, Year: {created_year}")
+
             except Exception as e:
                 print(f"Error parsing created_at: {created_at}. Error: {e}")
                 continue  # Skip to the next ticket if there's an error
 
-            # Append the filtered ticket data
-            filtered_tickets.append({
-                'Product - Service Desk Tool': product_name or 'No Product',  # Default to 'No Product' if None
-                'Action Taken': action_taken or 'No Action',  # Default to 'No Action' if None
-                'Ticket group': group_name,
-                'Ticket subject': subject,
-                'Ticket created - Day of month': created_day,
-                'Ticket created - Month': created_month,
-                'Ticket created - Year': created_year,  # Include the year in the output
-                'Tickets': 1
-            })
+            # Retrieve the product name and action taken from custom fields (None if not found)
+            found = [None, None]
+            for custom_field in ticket.get('custom_fields', ()):
+                slot = field_slots.get(custom_field['id'])
+                if slot is not None:
+                    found[slot[0]] = custom_field.get('value', slot[1])
+
+            solved_date, reopens, resolution_minutes = read_metric_set(metric_sets.get(ticket.get('id')))
+
+            # Append the filtered ticket to each column
+            append_id(ticket.get('id'))
+            append_product(found[0] or 'No Product')  # Default to 'No Product' if None
+            append_action(found[1] or 'No Action')  # Default to 'No Action' if None
+            append_group(group_map.get(ticket.get('group_id', ' '), 'Unknown'))
+            append_subject(ticket.get('subject', ''))
+            append_day(created_day)
+            append_month(created_month)
+            append_year(created_year)
+            append_tickets(1)
+            append_solved(solved_date)  # From the sideloaded metric set; empty while unsolved
+            append_reopens(reopens)
+            append_resolution(resolution_minutes)
 
     # Print the schema and the first ticket for verification
-    if filtered_tickets:
+    if len(batch):
         print("Schema of pulled tickets:")
-        print(", ".join(filtered_tickets[0].keys()))  # Print column names (schema)
+        print(", ".join(TicketBatch.columns))  # Print column names (schema)
         print("\nSample Ticket Data:")
-        print(filtered_tickets[0])  # Print the first ticket for inspection
+        print(batch.row(0))  # Print the first ticket for inspection
 
-    return filtered_tickets
+    return batch
 
-def main():
-    # Fetch groups dynamically
-    group_map = fetch_groups()
+# Function to drop repeated tickets (e.g. a page served twice after a retry), keeping the latest copy
+def dedupe_tickets(tickets_fetched):
+    latest = {}
+    for position, ticket_id in enumerate(tickets_fetched.data['Ticket ID']):
+        latest[ticket_id] = position
+    if len(latest) < len(tickets_fetched):
+        print(f"Dropped {len(tickets_fetched) - len(latest)} duplicate tickets")
+        return tickets_fetched.take(list(latest.values()))
+    return tickets_fetched
+
+# Entry point: fetch the previous day's tickets and return them as a DataFrame.
+# In incremental mode the DataFrame is the run's delta (see fetch_incremental_tickets), while the ticket store
+# receives the current values of every new or changed ticket. The incremental checkpoint is only staged;
+# call commit_state once the delta has been delivered.
+def main(incremental=False, write_csv=True, ticket_store=None, refresh_groups=False, archive=None):
+    # Load the groups from the cache, refetching them once it has expired
+    group_map = load_group_map(refresh_groups)
 
     # Fetch tickets for the previous day
     end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
     start_date = end_date - timedelta(days=1)
 
-    # Fetch and process tickets
-    fetched_tickets = fetch_tickets_for_date_range(start_date.isoformat() + 'Z', end_date.isoformat() + 'Z', group_map)
+    # Fetch and process tickets, only those new or changed since the last checkpoint in incremental mode
+    if incremental:
+        fetched_tickets, delta_tickets = fetch_incremental_tickets(group_map, start_date, write_csv)
+        # A ticket updated again on a later page comes back once per page. The delta is already deduplicated
+        # by the checkpoint, and a solve correction shares its ticket's ID.
+        fetched_tickets = dedupe_tickets(fetched_tickets)
+    else:
+        fetched_tickets = fetch_tickets_for_date_range(start_date, end_date, group_map, write_csv, archive=archive)
+
+    # Upsert into the ticket store so organize only picks up new or changed tickets
+    if ticket_store is not None:
+        ticket_store.upsert_many(fetched_tickets)
 
-    # Save any remaining tickets to CSV
-    save_tickets_to_csv(fetched_tickets)
+    return delta_tickets.to_frame() if incremental else fetched_tickets.to_frame()
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='Extract equipment tickets from Zendesk')
+    parser.add_argument('--incremental', action='store_true', help='fetch only tickets new or changed since the last checkpoint')
+    parser.add_argument('--refresh-groups', action='store_true', help='refetch the groups even if the cached map has not expired')
+    args = parser.parse_args()
+    main(incremental=args.incremental, refresh_groups=args.refresh_groups)
+    # Run on its own, extract delivers its delta by writing extracted_data.csv
+    if args.incremental:
+        commit_state()
@@ -0,0 +1,154 @@
+import os
+import sys
+import time
+import json
+import random
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+# Peak memory comes from resource on Linux/macOS and from pywin32 on Windows
+try:
+    import resource
+except ImportError:
+    resource = None
+
+run_report_path = 'run_report.json'  # Full run report, including every Zendesk page
+prometheus_textfile_path = 'equipment_pipeline.prom'  # For the node_exporter textfile collector
+debug_sample_rate = float(os.environ.get('EQUIPMENT_DEBUG_SAMPLE_RATE', '0'))  # Fraction of raw tickets dumped in full
+
+lock = threading.Lock()
+stage_metrics = {}  # Stage name -> metrics, in run order
+page_metrics = []  # One entry per Zendesk page
+active_stage = None  # API counters are attributed to the stage that is running
+
+# Function to read the peak resident set size of this process in bytes, if the platform exposes it
+def get_peak_rss():
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024  # Linux reports kilobytes
+    try:
+        import win32process
+        return win32process.GetProcessMemoryInfo(win32process.GetCurrentProcess())['PeakWorkingSetSize']
+    except ImportError:
+        return None
+
+def new_stage_record():
+    return {
+        'wall_seconds': 0.0,
+        'cpu_seconds': 0.0,
+        'peak_rss_bytes': None,
+        'rows_in': None,
+        'rows_out': None,
+        'api_requests': 0,
+        'rate_limited': 0,
+        'retry_wait_seconds': 0.0,
+        'status': 'running'
+    }
+
+# Context manager that records wall time, CPU time and peak RSS of a stage
+@contextmanager
+def stage(name):
+    global active_stage
+    record = new_stage_record()
+    with lock:
+        stage_metrics[name] = record
+    previous_stage = active_stage
+    active_stage = name
+    wall_started = time.perf_counter()
+    cpu_started = time.process_time()
+    try:
+        yield record
+        record['status'] = 'ok'
+    except Exception:
+        record['status'] = 'failed'
+        raise
+    finally:
+        record['wall_seconds'] = time.perf_counter() - wall_started
+        record['cpu_seconds'] = time.process_time() - cpu_started
+        record['peak_rss_bytes'] = get_peak_rss()
+        active_stage = previous_stage
+
+def get_active_record():
+    if active_stage is None:
+        return None
+    return stage_metrics.get(active_stage)
+
+# Function to count one API response against the running stage
+def record_request(status_code):
+    record = get_active_record()
+    if record is None:
+        return
+    with lock:
+        record['api_requests'] += 1
+        if status_code == 429:
+            record['rate_limited'] += 1
+
+# Function to add time spent waiting on a Retry-After to the running stage
+def record_retry_wait(seconds):
+    record = get_active_record()
+    if record is None:
+        return
+    with lock:
+        record['retry_wait_seconds'] += seconds
+
+# Function to record one Zendesk page: what was fetched, how it ended, how many tickets and how long it took
+def record_page(source, status_code, tickets, seconds):
+    with lock:
+        page_metrics.append({
+            'stage': active_stage,
+            'source': source,
+            'status_code': status_code,
+            'tickets': tickets,
+            'seconds': round(seconds, 4)
+        })
+
+# Function to decide whether a raw ticket is dumped in full; never true at the default rate of 0
+def should_dump_ticket():
+    return debug_sample_rate > 0 and random.random() < debug_sample_rate
+
+# Function to reset the counters before a new run in the same interpreter
+def reset():
+    with lock:
+        stage_metrics.clear()
+        page_metrics.clear()
+
+# Function to write the JSON run report and the Prometheus textfile
+def write_reports(report_path=run_report_path, textfile_path=prometheus_textfile_path):
+    with lock:
+        stages = {name: dict(record) for name, record in stage_metrics.items()}
+        pages = list(page_metrics)
+
+    report = {'finished_at': datetime.utcnow().isoformat() + 'Z', 'stages': stages, 'pages': pages}
+    with open(report_path, 'w', encoding='utf-8') as report_file:
+        json.dump(report, report_file, indent=2)
+
+    # Per-page detail stays in the JSON report to keep Prometheus label cardinality low
+    metric_help = {
+        'wall_seconds': 'Wall time of the stage in seconds',
+        'cpu_seconds': 'CPU time of the stage in seconds',
+        'peak_rss_bytes': 'Peak resident set size of the process at the end of the stage',
+        'rows_in': 'Rows handed to the stage',
+        'rows_out': 'Rows produced by the stage',
+        'api_requests': 'Zendesk API requests made by the stage',
+        'rate_limited': 'Zendesk responses with status 429',
+        'retry_wait_seconds': 'Seconds spent waiting on Retry-After'
+    }
+    lines = []
+    for metric, help_text in metric_help.items():
+        lines.append(f"# HELP equipment_pipeline_stage_{metric} {help_text}")
+        lines.append(f"# TYPE equipment_pipeline_stage_{metric} gauge")
+        for name, record in stages.items():
+            if record[metric] is not None:
+                lines.append(f'equipment_pipeline_stage_{metric}{{stage="{name}"}} {record[metric]}')
+    lines.append("# HELP equipment_pipeline_stage_success Whether the stage finished without an error")
+    lines.append("# TYPE equipment_pipeline_stage_success gauge")
+    for name, record in stages.items():
+        lines.append(f'equipment_pipeline_stage_success{{stage="{name}"}} {int(record["status"] == "ok")}')
+
+    # Write and rename so the collector never reads a half-written file
+    temp_path = textfile_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8', newline='\n') as textfile:
+        textfile.write('\n'.join(lines) + '\n')
+    os.replace(temp_path, textfile_path)
+    print(f"Run report saved to {report_path} and {textfile_path}")
@@ -1,15 +1,17 @@
+import argparse
 import pandas as pd
 import numpy as np
 import re  # Import regex module
+import storage
+from classification_cache import ClassificationCache, normalize_subject, hash_keyword_tables
 
-# Load the CSV file
+# Input and output files
 ticket_data_path = 'extracted_data.csv'  # Replace with your file path
-df = pd.read_csv(ticket_data_path)
+updated_ticket_data_path = 'organized_data.csv'  # Replace with your desired output file path
+use_classification_cache = True  # Reuse classifications of previously seen subjects across runs
 
-# Remove specified columns (if you still want to drop them)
+# Columns to remove (if you still want to drop them)
 columns_to_remove = ['Product - Service Desk Tool', 'Action Taken', 'Ticket group']
-df.drop(columns=columns_to_remove, inplace=True, errors='ignore')  # Use errors='ignore' to avoid errors if any column is not found
-
 
 # Define the values for the new columns
 equipment_statuses = [
@@ -19,14 +21,6 @@ equipment_statuses = [
     "Broken Hardware"
 ]
 
-# Initialize the Equipment Category and Status columns
-df['Equipment Category'] = ''  # Initialize the Equipment Category column
-df['Equipment Status'] = ''  # Initialize the Equipment Status column
-
-# Copy the existing columns for Ticket solved - Date and Solved tickets
-df['Ticket solved - Date'] = df.get('Ticket solved - Date', '')  # Copy if exists, otherwise initialize to empty
-df['Solved tickets'] = df.get('Solved tickets', '')  # Copy if exists, otherwise initialize to empty
-
 # Define categories and corresponding keywords with regex patterns
 category_keywords = {
     "Laptop": [r'.*laptop.*', r'.*computer.*', r'.*bitlocker.*', r'.*reimage.*', r'.*chromebook.*', r'.*chromebooks.*', r'.*windows.*', r'.*HP.*', r'.*autopilot.*', r'.*latpop.*'], 
@@ -74,15 +68,134 @@ def determine_status(ticket_subject):
             
     return 'Picked up/Shipped'  # Return 'Other' if no match found
 
-# Apply the functions to the Ticket subject column to determine Equipment Category and Status
-df['Equipment Category'] = df['Ticket subject'].apply(determine_category)
-df['Equipment Status'] = df['Ticket subject'].apply(determine_status)
+# Function to compile a keyword table into a single pattern that keeps the table's priority order.
+# Each label becomes one branch that looks ahead for any of its keywords; the branches are tried
+# in order, so the first label with a match anywhere in the subject wins, like the loops above.
+def compile_keyword_table(keyword_table):
+    branches = []
+    for keywords in keyword_table.values():
+        # The leading and trailing .* only add backtracking to a search, so drop them
+        stripped_keywords = [re.sub(r'^\.\*|\.\*$', '', keyword) for keyword in keywords]
+        alternation = '|'.join(stripped_keywords) if stripped_keywords else '(?!)'
+        branches.append(f'(?=.*?(?:{alternation}))()')
+    pattern = re.compile('(?:' + '|'.join(branches) + ')', re.IGNORECASE | re.DOTALL)
+    return pattern, list(keyword_table)
 
-# Save the updated DataFrame back to a new CSV file
-updated_ticket_data_path = 'organized_data.csv'  # Replace with your desired output file path
-df.to_csv(updated_ticket_data_path, index=False)
+# Compile both keyword tables once at import
+category_pattern, category_labels = compile_keyword_table(category_keywords)
+status_pattern, status_labels = compile_keyword_table(status_keywords)
+
+# Fingerprint of both keyword tables, used to invalidate cached classifications
+keyword_tables_hash = hash_keyword_tables(category_keywords, status_keywords)
+
+# Function to look up the first matching label of a compiled keyword table
+def match_label(ticket_subject, pattern, labels, default):
+    match = pattern.match(ticket_subject)
+    return labels[match.lastindex - 1] if match else default
+
+# Function to determine (Equipment Category, Equipment Status) for one subject
+def classify_subject(ticket_subject):
+    return (match_label(ticket_subject, category_pattern, category_labels, 'Other'),
+            match_label(ticket_subject, status_pattern, status_labels, 'Picked up/Shipped'))
+
+# Function to determine Equipment Category and Status for a whole Ticket subject column.
+# Each distinct subject is classified once and the results are mapped back onto the column.
+def classify_subjects(ticket_subjects, cache=None):
+    unique_subjects = ticket_subjects.dropna().unique()
+
+    if cache is None:
+        lookup = {subject: classify_subject(subject) for subject in unique_subjects}
+    else:
+        # Subjects that only differ in ASCII case or surrounding whitespace share one cache entry.
+        # A missing entry is classified from the subject itself, never from its key.
+        subject_keys = {subject: normalize_subject(subject) for subject in unique_subjects}
+        known = cache.get_many(set(subject_keys.values()))
+        missing = {}
+        for subject, key in subject_keys.items():
+            if key not in known and key not in missing:
+                missing[key] = classify_subject(subject)
+        cache.put_many(missing)
+        known.update(missing)
+        lookup = {subject: known[key] for subject, key in subject_keys.items()}
+
+    # Missing subjects are 'Other' for both columns
+    categories = ticket_subjects.map({subject: labels[0] for subject, labels in lookup.items()}).fillna('Other')
+    statuses = ticket_subjects.map({subject: labels[1] for subject, labels in lookup.items()}).fillna('Other')
+    return categories, statuses
+
+# Function to add Equipment Category and Status columns to extracted ticket data
+def organize_tickets(df, cache=None):
+    # Remove specified columns
+    df = df.drop(columns=columns_to_remove, errors='ignore')  # Use errors='ignore' to avoid errors if any column is not found
+
+    # Empty subjects come back from CSV as NaN, so treat in-memory empty subjects the same way
+    df['Ticket subject'] = df['Ticket subject'].replace('', np.nan)
+
+    # Initialize the Equipment Category and Status columns
+    df['Equipment Category'] = ''  # Initialize the Equipment Category column
+    df['Equipment Status'] = ''  # Initialize the Equipment Status column
+
+    # Copy the existing columns for Ticket solved - Date and Solved tickets
+    df['Ticket solved - Date'] = df.get('Ticket solved - Date', '')  # Copy if exists, otherwise initialize to empty
+    df['Solved tickets'] = df.get('Solved tickets', '')  # Copy if exists, otherwise initialize to empty
+
+    # Classify the Ticket subject column to determine Equipment Category and Status
+    df['Equipment Category'], df['Equipment Status'] = classify_subjects(df['Ticket subject'], cache)
+
+    return df
+
+# Function to organize extracted_data.csv chunk by chunk into organized_data.csv, holding one chunk in memory at a time.
+# Returns the number of rows written and how many of them fell in the 'Other' category.
+def organize_csv_in_chunks(input_path, output_path, chunk_size, cache=None):
+    row_count = 0
+    other_count = 0
+    for chunk in storage.read_csv_chunks(input_path, chunk_size):
+        chunk = organize_tickets(chunk, cache)
+        chunk.to_csv(output_path, mode='w' if row_count == 0 else 'a', index=False, header=row_count == 0)
+        row_count += len(chunk)
+        other_count += int((chunk['Equipment Category'] == 'Other').sum())
+        print(f"Organized {row_count} tickets")
+    return row_count, other_count
+
+# Entry point: organize a DataFrame (or extracted_data.csv) and optionally save organized_data.csv.
+# With a chunk_size and no DataFrame, extracted_data.csv is streamed to organized_data.csv and None is returned.
+def main(df=None, write_csv=True, chunk_size=None):
+    if df is None and chunk_size:
+        cache = ClassificationCache(keyword_tables_hash) if use_classification_cache else None
+        try:
+            row_count, other_count = organize_csv_in_chunks(ticket_data_path, updated_ticket_data_path, chunk_size, cache)
+        finally:
+            if cache is not None:
+                cache.report()
+                cache.close()
+        print(f"Updated data saved to organized_data.csv ({row_count} rows, {chunk_size} rows per chunk)")
+        print(f"Total 'Other' categories: {other_count}")
+        return None
+
+    # Load the CSV file when no DataFrame is handed over
+    if df is None:
+        df = pd.read_csv(ticket_data_path)
+
+    cache = ClassificationCache(keyword_tables_hash) if use_classification_cache else None
+    try:
+        df = organize_tickets(df, cache)
+    finally:
+        if cache is not None:
+            cache.report()
+            cache.close()
+
+    # Save the updated DataFrame back to a new CSV file
+    if write_csv:
+        df.to_csv(updated_ticket_data_path, index=False)
+        print("New columns added and specified columns removed. Updated data saved to organized_data.csv")
+
+    # Debugging: Check how many tickets are in 'Other'
+    print(f"Total 'Other' categories: {df['Equipment Category'].value_counts().get('Other', 0)}")
 
-print("New columns added and specified columns removed. Updated data saved to organized_data.csv")
+    return df
 
-# Debugging: Check how many tickets are in 'Other'
-print(f"Total 'Other' categories: {df['Equipment Category'].value_counts().get('Other', 0)}")
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Add Equipment Category and Status to extracted_data.csv')
+    parser.add_argument('--chunk-size', type=int, help='stream the input in chunks of this many rows to bound memory')
+    args = parser.parse_args()
+    main(chunk_size=args.chunk_size)
@@ -0,0 +1,173 @@
+import os
+import glob
+import gzip
+import json
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta
+import pandas as pd
+import extract
+import organize
+import aggregate
+import rollup_cube
+
+archive_dir = 'page_archive'  # One directory per day of raw search pages, kept across runs
+groups_file_name = 'groups.json'  # Group map of the latest archiving run, so replay needs no API call
+replay_output_path = os.path.join(archive_dir, 'replay_aggregated_data.csv')  # Replayed days merged in date order, out of reach of main.delete_files
+
+# Append-only archive of raw search.json pages, partitioned by the day of their search window.
+# Every process writes its own gzip file per day with one gzip member per page, plus an index line per page
+# with the member's offset and length, so concurrent backfill workers never write to the same file.
+class PageArchive:
+    def __init__(self, root=archive_dir):
+        self.root = root
+        self.run_id = datetime.utcnow().strftime('%Y%m%dT%H%M%S%f')  # Replay reads each day from its latest run
+        self.file_stem = f'{self.run_id}-{os.getpid()}'
+        self.lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+
+    def save_groups(self, group_map):
+        extract.save_group_cache(group_map, os.path.join(self.root, groups_file_name))
+
+    # Function to append one raw page and the metric sets fetched for it; called from the fetch worker threads
+    def append_page(self, window_start, window_end, page_number, response_data, metric_sets):
+        record = {
+            'window_start': extract.format_search_time(window_start),
+            'window_end': extract.format_search_time(window_end),
+            'page': page_number,
+            'response': response_data,
+            'metric_sets': list(metric_sets.values())
+        }
+        member = gzip.compress((json.dumps(record) + '\n').encode('utf-8'))
+        day_dir = os.path.join(self.root, f'{window_start:%Y-%m-%d}')
+
+        with self.lock:
+            os.makedirs(day_dir, exist_ok=True)
+            data_name = self.file_stem + '.ndjson.gz'
+            with open(os.path.join(day_dir, data_name), 'ab') as data_file:
+                offset = data_file.tell()
+                data_file.write(member)
+
+            # The index line is written last, so a page only counts once its data is complete
+            entry = {
+                'run_id': self.run_id,
+                'data_file': data_name,
+                'offset': offset,
+                'length': len(member),
+                'window_start': record['window_start'],
+                'window_end': record['window_end'],
+                'page': page_number,
+                'tickets': len(response_data.get('results', []))
+            }
+            with open(os.path.join(day_dir, self.file_stem + '.index.ndjson'), 'a', encoding='utf-8') as index_file:
+                index_file.write(json.dumps(entry) + '\n')
+
+# Function to read the index lines of a day; a torn last line from an interrupted run is skipped
+def read_index(day, root=archive_dir):
+    entries = []
+    for index_path in sorted(glob.glob(os.path.join(root, day, '*.index.ndjson'))):
+        with open(index_path, 'r', encoding='utf-8') as index_file:
+            for line in index_file:
+                try:
+                    entries.append(json.loads(line))
+                except ValueError:
+                    print(f"Skipping a torn index line in {index_path}")
+    return entries
+
+# Function to read the pages of a day's latest run in fetch order
+def load_day_pages(day, root=archive_dir):
+    entries = read_index(day, root)
+    if not entries:
+        return []
+    latest_run = max(entry['run_id'] for entry in entries)
+    entries = sorted((entry for entry in entries if entry['run_id'] == latest_run), key=lambda entry: (entry['window_start'], entry['page']))
+
+    pages = []
+    data_files = {}
+    try:
+        for entry in entries:
+            if entry['data_file'] not in data_files:
+                data_files[entry['data_file']] = open(os.path.join(root, day, entry['data_file']), 'rb')
+            data_file = data_files[entry['data_file']]
+            data_file.seek(entry['offset'])
+            pages.append(json.loads(gzip.decompress(data_file.read(entry['length']))))
+    finally:
+        for data_file in data_files.values():
+            data_file.close()
+    return pages
+
+# Function to rebuild one day's aggregated rows from its archived pages inside a worker process, without any API call
+def replay_day(day, group_map, root=archive_dir):
+    tickets = extract.TicketBatch()
+    for page in load_day_pages(day, root):
+        metric_sets = {metric_set['ticket_id']: metric_set for metric_set in page['metric_sets']}
+        tickets.extend(extract.process_tickets(page['response'].get('results', []), group_map, metric_sets))
+    tickets = extract.dedupe_tickets(tickets)
+    if not len(tickets):
+        return pd.DataFrame(columns=aggregate.output_columns)
+    return aggregate.aggregate_tickets(organize.organize_tickets(tickets.to_frame()))
+
+def list_days(start_date, end_date):
+    return [f'{start_date + timedelta(days=offset):%Y-%m-%d}' for offset in range((end_date - start_date).days)]
+
+# Entry point: reprocess the archived days in [start_date, end_date) with the current keyword tables and aggregation
+def run_replay(start_date, end_date, workers=4, root=archive_dir, output_path=replay_output_path):
+    _, group_map = extract.load_group_cache(os.path.join(root, groups_file_name))
+    if group_map is None:
+        raise ValueError(f"No archived group map in {root}; archive at least one run first")
+
+    days = [day for day in list_days(start_date, end_date) if read_index(day, root)]
+    print(f"Replaying {len(days)} archived days between {start_date:%Y-%m-%d} and {end_date:%Y-%m-%d}")
+
+    results = {}
+    failed = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(replay_day, day, group_map, root): day for day in days}
+        for future in as_completed(futures):
+            day = futures[future]
+            try:
+                results[day] = future.result()
+            except Exception as e:
+                print(f"Replay of {day} failed: {e}")
+                failed.append(day)
+
+    if failed:
+        print(f"{len(failed)} days failed to replay: {', '.join(sorted(failed))}")
+        return None
+
+    replayed = [results[day] for day in days if not results[day].empty]
+    merged_df = pd.concat(replayed, ignore_index=True) if replayed else pd.DataFrame(columns=aggregate.output_columns)
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
+    merged_df.to_csv(output_path, index=False)
+    print(f"Replayed {len(days)} days into {output_path}")
+    if aggregate.update_rollup_cube and not merged_df.empty:
+        rollup_cube.refresh_cube(merged_df)
+    return merged_df
+
+# Function to print the archived pages and tickets per day
+def print_summary(root=archive_dir):
+    for day in sorted(os.path.basename(path) for path in glob.glob(os.path.join(root, '*-*-*'))):
+        entries = read_index(day, root)
+        runs = {entry['run_id'] for entry in entries}
+        latest = [entry for entry in entries if entry['run_id'] == max(runs)] if runs else []
+        print(f"{day}: {len(latest)} pages, {sum(entry['tickets'] for entry in latest)} tickets in the latest of {len(runs)} runs")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Inspect or replay the archive of raw Zendesk search pages')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    replay_parser = subparsers.add_parser('replay', help='rebuild aggregated history from archived pages, with no API calls')
+    replay_parser.add_argument('start_date', help='first day to replay (YYYY-MM-DD)')
+    replay_parser.add_argument('end_date', help='day after the last day to replay (YYYY-MM-DD)')
+    replay_parser.add_argument('--workers', type=int, default=4, help='number of worker processes')
+
+    subparsers.add_parser('list', help='archived pages and tickets per day')
+
+    parser.add_argument('--archive-dir', default=archive_dir, help='archive root directory')
+    args = parser.parse_args()
+
+    if args.command == 'list':
+        print_summary(args.archive_dir)
+    else:
+        run_replay(datetime.strptime(args.start_date, '%Y-%m-%d'), datetime.strptime(args.end_date, '%Y-%m-%d'), args.workers, args.archive_dir)
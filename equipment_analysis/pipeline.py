@@ -0,0 +1,184 @@
+import extract
+import organize
+import aggregate
+import convert
+import upload
+import storage
+import metrics
+import streaming
+import page_archive
+from ticket_store import TicketStore
+
+# Default run options; run_pipeline overrides them per run
+default_options = {
+    'write_artifacts': True,  # Write the intermediate files to disk
+    'intermediate_format': 'csv',  # 'csv', 'parquet' or 'arrow'
+    'incremental': False,  # Use the checkpointed incremental export in extract
+    'use_ticket_store': False,  # Upsert extracted tickets by ID and organize only days with new or changed tickets
+    'replace_uploaded_days': False,  # Ticket store runs: replace the workbook rows of re-read days instead of skipping them (see upload.add_rows)
+    'chunk_size': None,  # Rows per chunk when organize and aggregate stream their CSV intermediates; None loads them whole
+    'streaming': False,  # Classify and aggregate pages while extract is still fetching, as one 'stream' stage
+    'archive_pages': False  # Keep every raw search page in page_archive/ for offline replay
+}
+
+# Function to load a stage input from disk when its upstream stage did not run in this pipeline
+def load_input(df, name, options):
+    if df is None and options['intermediate_format'] != 'csv':
+        return storage.read_frame(name, options['intermediate_format'])
+    return df  # None lets the stage read its own CSV
+
+# Function to save a typed intermediate; CSV intermediates are written by the stages themselves
+def save_output(df, name, options):
+    if options['write_artifacts'] and options['intermediate_format'] != 'csv':
+        storage.write_frame(df, name, options['intermediate_format'])
+
+def get_archive(options):
+    return page_archive.PageArchive() if options['archive_pages'] else None
+
+def writes_csv(options):
+    return options['write_artifacts'] and options['intermediate_format'] == 'csv'
+
+# Chunked processing reads and writes the CSV intermediates, so it needs them on disk
+def streams_csv(options):
+    return bool(options['chunk_size']) and writes_csv(options)
+
+# Incremental runs without the ticket store carry only the new tickets of their days, which add to what earlier
+# runs wrote for those days in the workbook and the rollup cube; every other run (streaming runs always fetch the whole day)
+# carries whole days, which replace them in the rollup cube and are skipped or replaced in the workbook (replace_uploaded_days)
+def has_partial_days(options):
+    return options['incremental'] and not options['use_ticket_store'] and not options['streaming']
+
+# Stage functions: each takes its upstream outputs (None when that stage did not run in this pipeline)
+def run_extract(options):
+    write_csv = writes_csv(options)
+    store = TicketStore() if options['use_ticket_store'] else None
+    try:
+        df = extract.main(incremental=options['incremental'], write_csv=write_csv, ticket_store=store, archive=get_archive(options))
+    finally:
+        if store is not None:
+            store.close()
+    if df.empty:
+        raise ValueError("No tickets extracted")
+    save_output(df, 'extracted_data', options)
+    return df
+
+def run_organize(extracted_df, options):
+    if options['use_ticket_store']:
+        # Read back whole days with new or changed tickets instead of this run's extract output
+        store = TicketStore()
+        try:
+            extracted_df = store.read_pending()
+        finally:
+            store.close()
+        if extracted_df.empty:
+            raise ValueError("No new or changed tickets since the last run")
+    elif streams_csv(options):
+        # Stream extracted_data.csv instead of organizing the extracted DataFrame in one piece
+        return organize.main(chunk_size=options['chunk_size'])
+    else:
+        extracted_df = load_input(extracted_df, 'extracted_data', options)
+    df = organize.main(extracted_df, write_csv=writes_csv(options))
+    save_output(df, 'organized_data', options)
+    return df
+
+def run_aggregate(organized_df, options):
+    if organized_df is None and streams_csv(options):
+        return aggregate.main(chunk_size=options['chunk_size'], partial_days=has_partial_days(options))
+    # Ticket store runs read back every day changed since the watermark, and each day needs its own totals
+    df = aggregate.main(load_input(organized_df, 'organized_data', options), write_csv=writes_csv(options),
+                        partial_days=has_partial_days(options), per_day=options['use_ticket_store'])
+    save_output(df, 'aggregated_data', options)
+    return df
+
+# Stands in for extract, organize and aggregate in streaming runs
+def run_stream(options):
+    df = streaming.main(write_csv=writes_csv(options), archive=get_archive(options))
+    save_output(df, 'aggregated_data', options)
+    return df
+
+def run_convert(aggregated_df, options):
+    # The XLSX is only an on-disk artifact; upload receives the same rows in memory
+    aggregated_df = load_input(aggregated_df, 'aggregated_data', options)
+    return convert.main(aggregated_df, write_xlsx_file=options['write_artifacts'])
+
+def run_upload(converted, options):
+    # Without a convert stage in this run, upload reads aggregated_data.xlsx itself
+    columns, rows = converted if converted is not None else (None, None)
+    upload.sync_and_update_excel(columns, rows, partial_days=has_partial_days(options),
+                                 replace_days=options['use_ticket_store'] and options['replace_uploaded_days'])
+
+# Function to count the rows of a stage input or output for the run report
+def count_rows(value):
+    if value is None:
+        return None
+    if isinstance(value, tuple):  # (columns, rows) from convert
+        return len(value[1])
+    return len(value)
+
+# Pipeline DAG: stage name -> (upstream stages, stage function), declared in dependency order
+stages = {
+    'extract': ([], run_extract),
+    'organize': (['extract'], run_organize),
+    'aggregate': (['organize'], run_aggregate),
+    'convert': (['aggregate'], run_convert),
+    'upload': (['convert'], run_upload),
+}
+
+# Pipeline DAG of streaming runs, where one overlapped stage replaces extract, organize and aggregate
+streaming_stages = {
+    'stream': ([], run_stream),
+    'convert': (['stream'], run_convert),
+    'upload': (['convert'], run_upload),
+}
+fused_stage_names = {'extract', 'organize', 'aggregate'}
+
+# Function to run the selected stages in one interpreter, passing DataFrames in memory
+def run_pipeline(stage_names, **run_options):
+    options = dict(default_options, **run_options)
+    results = {}
+    failed = set()
+    metrics.reset()
+
+    pipeline_stages = stages
+    if options['streaming']:
+        pipeline_stages = streaming_stages
+        if fused_stage_names & set(stage_names):
+            stage_names = list(stage_names) + ['stream']
+
+    for name, (upstream, stage_function) in pipeline_stages.items():
+        if name not in stage_names:
+            continue
+
+        # Skip a stage when any of its upstream stages failed or was skipped
+        if any(dep in failed for dep in upstream):
+            print(f"Skipping {name} because an upstream stage failed")
+            failed.add(name)
+            continue
+
+        inputs = [results.get(dep) for dep in upstream]
+
+        try:
+            print(f"Running {name}...")
+            with metrics.stage(name) as record:
+                record['rows_in'] = count_rows(inputs[0]) if inputs else None
+                results[name] = stage_function(*inputs, options)
+                record['rows_out'] = count_rows(results[name])
+            print(f"Successfully ran {name}")
+        except Exception as e:
+            print(f"Failed to run {name}: {e}")
+            failed.add(name)
+
+    # Only a fully successful run moves the ticket store watermark, so a failed run is redone next time
+    if options['use_ticket_store'] and 'organize' in results and not failed:
+        store = TicketStore()
+        try:
+            store.advance_watermark()
+        finally:
+            store.close()
+
+    # Likewise the incremental checkpoint, so the tickets of a failed run are exported again
+    if options['incremental'] and 'extract' in results and not failed:
+        extract.commit_state()
+
+    metrics.write_reports()
+    return results, failed
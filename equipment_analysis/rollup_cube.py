@@ -0,0 +1,137 @@
+import sys
+import time
+import sqlite3
+import argparse
+from datetime import date, timedelta
+import pandas as pd
+
+rollup_cube_path = 'rollup_cube.sqlite'  # Ticket counts by date, status and category, kept across runs
+summary_subjects = ['Status Total', 'Total']  # Rows aggregate.py adds on top of the ticket rows
+
+# Grain -> SQLite expression that maps a date to the first day of its period (weeks start on Monday)
+grain_expressions = {
+    'day': 'date',
+    'week': "date(date, 'weekday 0', '-6 days')",
+    'month': "strftime('%Y-%m-01', date)",
+    'year': "strftime('%Y-01-01', date)"
+}
+
+# Function to reduce aggregated rows to one ticket count per (date, status, category) cell
+def build_cells(aggregated_df):
+    ticket_rows = aggregated_df[~aggregated_df['Ticket subject'].isin(summary_subjects)]
+    cells = (ticket_rows.astype({'Equipment Status': object, 'Equipment Category': object})
+             .fillna({'Equipment Status': '', 'Equipment Category': ''})
+             .groupby(['Date', 'Equipment Status', 'Equipment Category'])['Tickets'].sum().reset_index())
+    return cells
+
+# Function to merge cells built from separate batches of the same run; None stands for no cells yet
+def merge_cells(left, right):
+    if left is None:
+        return right
+    return pd.concat([left, right]).groupby(['Date', 'Equipment Status', 'Equipment Category'])['Tickets'].sum().reset_index()
+
+# SQLite table with one row per (date, status, category) cell, clustered on date for range queries
+class RollupCube:
+    def __init__(self, db_path=rollup_cube_path):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('''CREATE TABLE IF NOT EXISTS cube (
+            date TEXT NOT NULL,
+            status TEXT NOT NULL,
+            category TEXT NOT NULL,
+            tickets INTEGER NOT NULL,
+            PRIMARY KEY (date, status, category)) WITHOUT ROWID''')
+        self.connection.commit()
+
+    # Function to fold the days in an aggregated batch into the cube. Each day in the batch replaces what the
+    # cube held for that day, so re-running a day (or re-reading it from the ticket store) never double-counts.
+    # With partial_days the batch holds only the tickets new since the last run (an incremental extract),
+    # so its counts add to the cube's cells instead.
+    def refresh(self, aggregated_df, partial_days=False):
+        return self.refresh_cells(build_cells(aggregated_df), partial_days)
+
+    # Function to fold cells that were already reduced (e.g. merged across chunks) into the cube
+    def refresh_cells(self, cells, partial_days=False):
+        days = sorted(cells['Date'].unique())
+        rows = [(row[0], row[1], row[2], int(row[3])) for row in cells.itertuples(index=False)]
+        with self.connection:
+            if partial_days:
+                self.connection.executemany('''INSERT INTO cube (date, status, category, tickets) VALUES (?, ?, ?, ?)
+                                               ON CONFLICT (date, status, category) DO UPDATE SET tickets = tickets + excluded.tickets''', rows)
+            else:
+                self.connection.executemany('DELETE FROM cube WHERE date = ?', [(day,) for day in days])
+                self.connection.executemany('INSERT INTO cube (date, status, category, tickets) VALUES (?, ?, ?, ?)', rows)
+        print(f"Rollup cube {'added to' if partial_days else 'refreshed'} for {len(days)} days ({len(cells)} cells)")
+        return len(days)
+
+    # Function to answer a range query from the cube: tickets per period, optionally for one status and/or category
+    def query(self, start_date, end_date, grain='day', status=None, category=None, by=()):
+        period = grain_expressions[grain]
+        group_columns = [column for column in ('status', 'category') if column in by]
+        select_columns = ', '.join([f'{period} AS period'] + group_columns)
+        conditions = ['date >= ?', 'date <= ?']
+        params = [str(start_date), str(end_date)]
+        if status is not None:
+            conditions.append('status = ?')
+            params.append(status)
+        if category is not None:
+            conditions.append('category = ?')
+            params.append(category)
+
+        query = f'''SELECT {select_columns}, SUM(tickets) AS tickets FROM cube
+                    WHERE {' AND '.join(conditions)}
+                    GROUP BY {', '.join(['period'] + group_columns)}
+                    ORDER BY {', '.join(['period'] + group_columns)}'''
+        return pd.read_sql_query(query, self.connection, params=params)
+
+    def close(self):
+        self.connection.close()
+
+# Function to fold an aggregated batch into the cube on disk
+def refresh_cube(aggregated_df, db_path=rollup_cube_path, partial_days=False):
+    cube = RollupCube(db_path)
+    try:
+        return cube.refresh(aggregated_df, partial_days)
+    finally:
+        cube.close()
+
+# Function to fold reduced cells into the cube on disk
+def refresh_cube_cells(cells, db_path=rollup_cube_path, partial_days=False):
+    cube = RollupCube(db_path)
+    try:
+        return cube.refresh_cells(cells, partial_days)
+    finally:
+        cube.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Query or load the date x status x category rollup cube')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    query_parser = subparsers.add_parser('query', help='tickets per period, e.g. query --days 90 --grain week --category Laptop --status Returned')
+    query_parser.add_argument('--days', type=int, default=90, help='look back this many days up to --end (default 90)')
+    query_parser.add_argument('--start', type=date.fromisoformat, help='first date (YYYY-MM-DD), overrides --days')
+    query_parser.add_argument('--end', type=date.fromisoformat, default=date.today(), help='last date (YYYY-MM-DD), default today')
+    query_parser.add_argument('--grain', choices=list(grain_expressions), default='day')
+    query_parser.add_argument('--status', help='only this Equipment Status')
+    query_parser.add_argument('--category', help='only this Equipment Category')
+    query_parser.add_argument('--by', nargs='*', choices=['status', 'category'], default=[], help='also break down by these')
+
+    load_parser = subparsers.add_parser('load', help='fold an aggregated CSV (e.g. backfill/backfill_aggregated_data.csv) into the cube')
+    load_parser.add_argument('path')
+
+    parser.add_argument('--db', default=rollup_cube_path, help='cube database')
+    args = parser.parse_args()
+
+    if args.command == 'load':
+        refresh_cube(pd.read_csv(args.path, keep_default_na=False), args.db)
+        sys.exit(0)
+
+    start_date = args.start or args.end - timedelta(days=args.days - 1)
+    cube = RollupCube(args.db)
+    try:
+        started = time.perf_counter()
+        result = cube.query(start_date, args.end, args.grain, args.status, args.category, args.by)
+        elapsed_ms = (time.perf_counter() - started) * 1000
+    finally:
+        cube.close()
+    print(result.to_string(index=False) if not result.empty else "No tickets in range")
+    print(f"{start_date} to {args.end} by {args.grain}, answered in {elapsed_ms:.1f} ms")
@@ -0,0 +1,126 @@
+import argparse
+import pandas as pd
+
+# File extension for each supported intermediate format
+format_extensions = {'csv': '.csv', 'parquet': '.parquet', 'arrow': '.arrow'}
+
+# Explicit schemas for the stage hand-offs: integer date parts, categorical labels, string subjects
+extracted_schema = {
+    'Product - Service Desk Tool': 'category',
+    'Action Taken': 'category',
+    'Ticket group': 'category',
+    'Ticket subject': 'string',
+    'Ticket created - Day of month': 'int8',
+    'Ticket created - Month': 'int8',
+    'Ticket created - Year': 'int16',
+    'Tickets': 'int32',
+    'Ticket solved - Date': 'string',
+    'Reopens': 'Int32',
+    'Full resolution time (minutes)': 'Int64'
+}
+
+organized_schema = {
+    'Ticket subject': 'string',
+    'Ticket created - Day of month': 'int8',
+    'Ticket created - Month': 'int8',
+    'Ticket created - Year': 'int16',
+    'Tickets': 'int32',
+    'Equipment Category': 'category',
+    'Equipment Status': 'category',
+    'Ticket solved - Date': 'string',
+    'Solved tickets': 'string',
+    'Reopens': 'Int32',
+    'Full resolution time (minutes)': 'Int64'
+}
+
+aggregated_schema = {
+    'Date': 'string',
+    'Ticket subject': 'string',
+    'Tickets': 'int64',
+    'Equipment Status': 'category',
+    'Equipment Category': 'category',
+    'Solved Tickets': 'int64'
+}
+
+# Intermediate name -> schema
+schemas = {
+    'extracted_data': extracted_schema,
+    'organized_data': organized_schema,
+    'aggregated_data': aggregated_schema
+}
+
+# Function to import pyarrow only when a columnar format is requested
+def import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.feather
+        import pyarrow.parquet
+    except ImportError:
+        raise ImportError("Parquet/Arrow intermediates require pyarrow (pip install pyarrow)")
+    return pyarrow
+
+def get_path(name, file_format='csv'):
+    return name + format_extensions[file_format]
+
+# Function to cast the columns named in a schema; other columns are left as they are
+def apply_schema(df, schema):
+    return df.astype({column: dtype for column, dtype in schema.items() if column in df.columns})
+
+# Function to pick the pandas dtype of an Arrow column on read: strings stay Arrow-backed instead of becoming
+# Python objects; None keeps pyarrow's default, which follows the pandas metadata written with the file
+def arrow_types_mapper(arrow_type):
+    pyarrow = import_pyarrow()
+    if pyarrow.types.is_string(arrow_type) or pyarrow.types.is_large_string(arrow_type):
+        return pd.StringDtype('pyarrow')
+    return None
+
+# Function to write an intermediate DataFrame in the requested format; columnar formats get the schema applied here
+def write_frame(df, name, file_format='csv'):
+    path = get_path(name, file_format)
+
+    if file_format == 'csv':
+        df.to_csv(path, index=False)
+    else:
+        pyarrow = import_pyarrow()
+        table = pyarrow.Table.from_pandas(apply_schema(df, schemas.get(name, {})), preserve_index=False)
+        if file_format == 'parquet':
+            pyarrow.parquet.write_table(table, path)
+        else:
+            # Uncompressed Arrow IPC can be memory-mapped without a decode step
+            pyarrow.feather.write_feather(table, path, compression='uncompressed')
+
+    print(f"Saved {len(df)} rows to {path}")
+    return path
+
+# Function to read an intermediate DataFrame. Columnar files already carry the schema, so no cast is needed.
+# Arrow IPC is memory-mapped and its columns are wrapped rather than copied: strings stay in the mapped buffers, and
+# split_blocks keeps numeric columns from being consolidated into new arrays. Parquet is compressed, so it is decoded.
+def read_frame(name, file_format='csv'):
+    path = get_path(name, file_format)
+
+    if file_format == 'csv':
+        return pd.read_csv(path)
+
+    pyarrow = import_pyarrow()
+    if file_format == 'parquet':
+        table = pyarrow.parquet.read_table(path)
+    else:
+        table = pyarrow.feather.read_table(path, memory_map=True)
+    return table.to_pandas(types_mapper=arrow_types_mapper, split_blocks=True)
+
+# Function to read a CSV intermediate in chunks of chunk_size rows. Subjects stay strings even in a chunk
+# where every subject looks numeric, so chunks parse the same way as the whole file.
+def read_csv_chunks(path, chunk_size):
+    return pd.read_csv(path, chunksize=chunk_size, dtype={'Ticket subject': str})
+
+# Function to export a columnar intermediate as CSV
+def export_csv(name, file_format):
+    df = read_frame(name, file_format)
+    return write_frame(df, name, 'csv')
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Export a Parquet/Arrow intermediate as CSV')
+    parser.add_argument('name', choices=sorted(schemas), help='intermediate to export')
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet', help='format the intermediate was stored in')
+    args = parser.parse_args()
+    export_csv(args.name, args.format)
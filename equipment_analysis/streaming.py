@@ -0,0 +1,144 @@
+import queue
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+import pandas as pd
+import extract
+import organize
+import aggregate
+import rollup_cube
+from classification_cache import ClassificationCache
+
+queue_size = 8  # Pages waiting for classification; fetch workers block once this many are queued
+max_pages_per_batch = 50  # Pages that queued up while the consumer was busy are classified together, up to this many
+
+# Consumer of fetched pages: classifies pages as they arrive. The totals and rollup cube cells are summed once
+# every page is in, because a ticket repeated on a later page replaces the copy that was classified first.
+class PageAggregator:
+    def __init__(self):
+        self.chunks = []  # (copy number of each row, aggregated ticket rows)
+        self.page_keys = []  # Page number -> fetch order key, to put the rows back into fetch order at the end
+        self.copy_pages = []  # Copy number -> page number; every fetched ticket is one copy, repeats included
+        self.copy_ids = []  # Copy number -> ticket ID
+        self.cells = None
+        self.ticket_count = 0
+        self.error = None
+
+    # Function to classify a list of (key, batch) pages in one go
+    def add(self, pages, cache):
+        combined = extract.TicketBatch()
+        first_copy = len(self.copy_ids)
+        for key, batch in pages:
+            combined.extend(batch)
+            self.copy_pages.extend([len(self.page_keys)] * len(batch))
+            self.page_keys.append(key)
+        self.copy_ids.extend(combined.data['Ticket ID'])
+        if not len(combined):
+            return
+
+        # build_ticket_rows keeps the index of the rows it keeps, which maps them back to their copies
+        ticket_rows = aggregate.build_ticket_rows(organize.organize_tickets(combined.to_frame(), cache))
+        self.chunks.append((first_copy + ticket_rows.index.to_numpy(dtype=np.int64), ticket_rows))
+
+    # Function to consume pages until the None end marker. After an error the queue is still drained,
+    # so fetch workers blocked on a full queue can finish.
+    def run(self, pages):
+        # The SQLite cache has to be opened on the thread that uses it
+        cache = ClassificationCache(organize.keyword_tables_hash) if organize.use_classification_cache else None
+        finished = False
+        try:
+            while not finished:
+                # Wait for one page, then take whatever else is already queued
+                batch_pages = [pages.get()]
+                while batch_pages[-1] is not None and len(batch_pages) < max_pages_per_batch:
+                    try:
+                        batch_pages.append(pages.get_nowait())
+                    except queue.Empty:
+                        break
+                if batch_pages[-1] is None:
+                    finished = True
+                    batch_pages.pop()
+
+                if self.error is None and batch_pages:
+                    try:
+                        self.add(batch_pages, cache)
+                    except Exception as e:
+                        self.error = e
+        finally:
+            if cache is not None:
+                cache.report()
+                cache.close()
+
+    # Function to build the same table aggregate.aggregate_tickets returns for the whole run, and its rollup cube cells
+    def result(self):
+        # Rank the pages in fetch order, and the copies by their page's rank and then their place on the page
+        fetch_order = sorted(range(len(self.page_keys)), key=self.page_keys.__getitem__)
+        page_ranks = np.empty(len(fetch_order), dtype=np.int64)
+        page_ranks[fetch_order] = np.arange(len(fetch_order))
+        copy_count = len(self.copy_ids)
+        copy_order = np.lexsort((np.arange(copy_count), page_ranks[np.asarray(self.copy_pages, dtype=np.int64)]))
+
+        # Like extract.dedupe_tickets: a repeated ticket keeps its latest copy, in the place of its first copy
+        ids_in_order = pd.Series(self.copy_ids, dtype=object).iloc[copy_order].reset_index(drop=True)
+        first_places = pd.Series(np.arange(copy_count)).groupby(ids_in_order.to_numpy()).transform('min').to_numpy()
+        is_latest = np.empty(copy_count, dtype=bool)
+        is_latest[copy_order] = ~ids_in_order.duplicated(keep='last').to_numpy()
+        copy_places = np.empty(copy_count, dtype=np.int64)
+        copy_places[copy_order] = first_places
+        self.ticket_count = int(is_latest.sum())
+
+        row_copies = np.concatenate([row_copies for row_copies, _ in self.chunks])
+        ticket_rows = pd.concat([rows for _, rows in self.chunks], ignore_index=True)
+        kept = is_latest[row_copies]
+        if not kept.all():
+            print(f"Dropped {len(kept) - int(kept.sum())} duplicate tickets")
+        ticket_rows = ticket_rows[kept].iloc[np.argsort(copy_places[row_copies[kept]], kind='stable')].reset_index(drop=True)
+
+        if aggregate.update_rollup_cube:
+            self.cells = rollup_cube.build_cells(ticket_rows)
+        return pd.concat([ticket_rows.astype({'Equipment Status': object, 'Equipment Category': object}),
+                          aggregate.build_total_rows(aggregate.partial_totals(ticket_rows))], ignore_index=True)
+
+# Function to fetch [start_date, end_date) and classify and aggregate its pages while later pages are still being fetched
+def stream_date_range(start_date, end_date, group_map, rate_limiter=None, archive=None):
+    pages = queue.Queue(maxsize=queue_size)
+    aggregator = PageAggregator()
+    consumer = threading.Thread(target=aggregator.run, args=(pages,), daemon=True)
+    consumer.start()
+
+    try:
+        # put blocks while the queue is full, which holds back the fetch workers
+        extract.fetch_tickets_for_date_range(start_date, end_date, group_map, write_csv=False, rate_limiter=rate_limiter,
+                                             on_batch=lambda key, batch: pages.put((key, batch)), archive=archive)
+    finally:
+        pages.put(None)
+        consumer.join()
+
+    if aggregator.error is not None:
+        raise aggregator.error
+    if not aggregator.chunks:
+        raise ValueError("No tickets extracted")
+    final_aggregated_data = aggregator.result()
+    print(f"Classified {aggregator.ticket_count} tickets while fetching")
+    return final_aggregated_data, aggregator.cells
+
+# Entry point: stream the previous day's tickets into the aggregated table and optionally save aggregated_data.csv
+def main(write_csv=True, archive=None):
+    group_map = extract.load_group_map()
+    end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = end_date - timedelta(days=1)
+
+    final_aggregated_data, cells = stream_date_range(start_date, end_date, group_map, archive=archive)
+
+    # Replace the run's days in the persisted date x status x category cube
+    if cells is not None:
+        rollup_cube.refresh_cube_cells(cells)
+
+    if write_csv:
+        final_aggregated_data.to_csv(aggregate.aggregated_output_path, index=False)
+        print("Final aggregated data saved to aggregated_data.csv")
+
+    return final_aggregated_data
+
+if __name__ == "__main__":
+    main()
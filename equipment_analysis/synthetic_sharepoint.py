@@ -0,0 +1,173 @@
+import json
+import hashlib
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, unquote
+
+stand_in_chunk_size = 64 * 1024  # Chunked transfer-encoding chunk size for file downloads
+token_lifetime_seconds = 3600  # expires_in of the client-credentials tokens the stand-in issues
+authority_host = 'https://login.microsoftonline.com'  # MSAL only accepts https endpoints, so the stand-in advertises these
+
+# Function to build the quoted ETag SharePoint sends for a file's content
+def build_etag(content):
+    return '"' + hashlib.sha1(content).hexdigest() + '"'
+
+# Function to read the server-relative URL out of a GetFileByServerRelativeUrl('...') or
+# getFolderByServerRelativeUrl('...') path segment
+def read_quoted_url(path, marker):
+    start = path.lower().index(marker.lower()) + len(marker)
+    end = path.index("')", start)
+    return unquote(path[start:end]).replace("''", "'")
+
+# Serves the SharePoint REST calls upload.py makes (file download with ETags, folder file listing)
+# and the Azure AD endpoints MSAL uses for client-credentials tokens; MSAL's requests to authority_host
+# have to be sent to base_url by its http_client
+class SharePointStandIn:
+    def __init__(self, files, tenant_id='test-tenant', host='127.0.0.1', port=0):
+        self.files = dict(files)  # Server-relative URL -> file content
+        self.tenant_id = tenant_id
+        self.lock = threading.Lock()
+        self.download_count = 0
+        self.not_modified_count = 0
+        self.not_found_count = 0
+        self.folder_lookup_count = 0
+        self.token_request_count = 0
+        self.server = ThreadingHTTPServer((host, port), self.build_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def count(self, counter):
+        with self.lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+            return getattr(self, counter)
+
+    # Function to list the files directly inside a folder, shaped like the verbose OData Files collection
+    def list_folder(self, folder_url):
+        folder_url = folder_url.rstrip('/')
+        return [{'Name': file_url.rsplit('/', 1)[1], 'ServerRelativeUrl': file_url, 'ETag': build_etag(content)}
+                for file_url, content in self.files.items() if file_url.rsplit('/', 1)[0] == folder_url]
+
+    def build_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            # HTTP/1.1 so file bodies can be sent with chunked transfer encoding
+            protocol_version = 'HTTP/1.1'
+
+            def send_json(self, status, body, headers=None):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json;odata=verbose')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def send_empty(self, status, headers=None):
+                self.send_response(status)
+                self.send_header('Content-Length', '0')
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+
+            def send_chunked(self, content, etag):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/octet-stream')
+                self.send_header('Transfer-Encoding', 'chunked')
+                self.send_header('ETag', etag)
+                self.end_headers()
+                for start in range(0, len(content), stand_in_chunk_size):
+                    chunk = content[start:start + stand_in_chunk_size]
+                    self.wfile.write(f'{len(chunk):X}\r\n'.encode('ascii') + chunk + b'\r\n')
+                self.wfile.write(b'0\r\n\r\n')
+
+            def read_body(self):
+                return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+            def is_authorized(self):
+                return (self.headers.get('Authorization') or '').startswith('Bearer stand-in-token-')
+
+            def do_GET(self):
+                path = urlparse(self.path).path
+                lowered_path = path.lower()
+
+                if lowered_path == f'/{stand_in.tenant_id}/v2.0/.well-known/openid-configuration':
+                    authority_url = f'{authority_host}/{stand_in.tenant_id}'
+                    self.send_json(200, {'issuer': f'{authority_url}/v2.0',
+                                         'authorization_endpoint': f'{authority_url}/oauth2/v2.0/authorize',
+                                         'token_endpoint': f'{authority_url}/oauth2/v2.0/token'})
+                elif not self.is_authorized():
+                    self.send_json(401, {'error': 'invalid_token'})
+                elif '/_api/web/getfilebyserverrelativeurl(' in lowered_path and lowered_path.endswith('/$value'):
+                    file_url = read_quoted_url(path, "GetFileByServerRelativeUrl('")
+                    content = stand_in.files.get(file_url)
+                    if content is None:
+                        stand_in.count('not_found_count')
+                        self.send_json(404, {'error': {'code': '-2130575338, System.IO.FileNotFoundException'}})
+                        return
+                    etag = build_etag(content)
+                    if self.headers.get('If-None-Match') == etag:
+                        stand_in.count('not_modified_count')
+                        self.send_empty(304, {'ETag': etag})
+                        return
+                    stand_in.count('download_count')
+                    self.send_chunked(content, etag)
+                elif '/_api/web/getfolderbyserverrelativeurl(' in lowered_path and lowered_path.endswith('/files'):
+                    stand_in.count('folder_lookup_count')
+                    folder_url = read_quoted_url(path, "getFolderByServerRelativeUrl('")
+                    self.send_json(200, {'d': {'results': stand_in.list_folder(folder_url)}})
+                else:
+                    self.send_json(404, {'error': 'InvalidEndpoint'})
+
+            def do_POST(self):
+                self.read_body()
+                lowered_path = urlparse(self.path).path.lower()
+
+                if lowered_path == f'/{stand_in.tenant_id}/oauth2/v2.0/token':
+                    token_number = stand_in.count('token_request_count')
+                    self.send_json(200, {'access_token': f'stand-in-token-{token_number}', 'token_type': 'Bearer',
+                                         'expires_in': token_lifetime_seconds})
+                elif not self.is_authorized():
+                    self.send_json(401, {'error': 'invalid_token'})
+                elif lowered_path.endswith('/_api/contextinfo'):
+                    # office365 asks for a request digest before its first query
+                    self.send_json(200, {'d': {'GetContextWebInformation': {
+                        'FormDigestValue': 'stand-in-digest', 'FormDigestTimeoutSeconds': 1800,
+                        'LibraryVersion': '16.0', 'SiteFullUrl': stand_in.base_url, 'WebFullUrl': stand_in.base_url}}})
+                else:
+                    self.send_json(404, {'error': 'InvalidEndpoint'})
+
+            # Keep the test output readable
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+if __name__ == "__main__":
+    stand_in = SharePointStandIn({'/sites/operations/Shared Documents/zendesk_ticket_analysis.xlsx': b'stand-in workbook'})
+    print(f"Serving one SharePoint file at {stand_in.base_url}. Press Ctrl+C to stop.")
+    try:
+        stand_in.server.serve_forever()
+    except KeyboardInterrupt:
+        stand_in.server.server_close()
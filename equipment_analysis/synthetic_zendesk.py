@@ -0,0 +1,238 @@
+import json
+import bisect
+import random
+import threading
+from datetime import datetime, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, urlencode
+from project_config import product_service_desk_tool_id, action_taken_id
+
+# Groups served by the stand-in; only the first two pass extract.allowed_group_names
+synthetic_groups = {
+    360001: 'Equipment',
+    360002: 'Equipment Waiting',
+    360003: 'Service Desk',
+    360004: 'Network'
+}
+equipment_group_share = 0.8  # Share of tickets that land in an equipment group
+
+# Building blocks for subjects that look like the ones the service desk writes
+subject_templates = [
+    '{device} return - {name}',
+    'Returned {device} from termed employee {name}',
+    'New hire equipment for {name}',
+    'New Hire - {name} - {device} needed',
+    'Ship {device} to {name}',
+    '{device} picked up by {name}',
+    'Broken {device} screen',
+    '{name} - damaged {device}, needs replacement',
+    'Replace {device} for {name}',
+    'Pickup request: {device}',
+    'Address confirmation for {device} shipment',
+    'New Acquisition: {device} for {office} office',
+    'Spare {device} for {office}',
+    '{device} not working',
+    'Question about {device}',
+    'Equipment request - {name}',
+    'Re: {device} approval',
+    'Amazon order for {device}'
+]
+subject_devices = [
+    'laptop', 'Laptop', 'HP EliteBook', 'Chromebook', 'computer', 'work phone', 'iPhone', 'Galaxy tablet', 'iPad',
+    'cell phone', 'SIM card', 'monitor', 'desktop PC', 'printer', 'Epson scanner', 'copier', 'desk phone',
+    'Yealink deskphone', 'landline', 'docking station', 'keyboard and mouse', 'headset', 'charger', 'USB-C dongle',
+    'HDMI cord', 'camera'
+]
+subject_names = ['J. Smith', 'Maria Garcia', 'Wei Chen', 'Priya Patel', 'Tom O\'Brien', 'Ana Souza', 'K. Nguyen', 'Lee Kim']
+subject_offices = ['Denver', 'Austin', 'Boise', 'Reno', 'Tucson', 'Fresno']
+product_values = ['laptop', 'mobile_device', 'desktop', 'printer', 'peripheral', None]
+action_values = ['shipped', 'returned', 'replaced', 'repaired', None]
+
+max_search_results = 1000  # Zendesk refuses to page past this many search results
+groups_per_page = 2  # Small on purpose, so the groups list spans several pages
+
+# Function to build one synthetic subject, with the odd blank subject and casing variation
+def generate_subject(rng):
+    roll = rng.random()
+    if roll < 0.01:
+        return ''
+    subject = rng.choice(subject_templates).format(device=rng.choice(subject_devices), name=rng.choice(subject_names),
+                                                   office=rng.choice(subject_offices))
+    if roll < 0.05:
+        return subject.upper()
+    if roll < 0.10:
+        return '  ' + subject.lower()
+    return subject
+
+# Function to generate synthetic raw tickets shaped like Zendesk search results, sorted by created_at
+def generate_tickets(count, start_date, end_date, seed=0, first_id=1):
+    rng = random.Random(seed)
+    span_seconds = int((end_date - start_date).total_seconds())
+    equipment_groups = list(synthetic_groups)[:2]
+    other_groups = list(synthetic_groups)[2:]
+
+    created_offsets = sorted(rng.randrange(span_seconds) for _ in range(count))
+    tickets = []
+    for ticket_number, offset in enumerate(created_offsets):
+        group_id = rng.choice(equipment_groups) if rng.random() < equipment_group_share else rng.choice(other_groups)
+        tickets.append({
+            'id': first_id + ticket_number,
+            'subject': generate_subject(rng),
+            'group_id': group_id,
+            'status': rng.choice(['new', 'open', 'pending', 'solved', 'closed']),
+            'created_at': (start_date + timedelta(seconds=offset)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+            'custom_fields': [
+                {'id': product_service_desk_tool_id, 'value': rng.choice(product_values)},
+                {'id': action_taken_id, 'value': rng.choice(action_values)}
+            ]
+        })
+    return tickets
+
+# Function to build the metric set Zendesk would sideload for a synthetic ticket
+def build_metric_set(ticket):
+    solved = ticket['status'] in ('solved', 'closed')
+    resolution_minutes = 30 + (ticket['id'] * 37) % 4000 if solved else None
+    solved_at = None
+    if solved:
+        created_at = datetime.strptime(ticket['created_at'], '%Y-%m-%dT%H:%M:%SZ')
+        solved_at = (created_at + timedelta(minutes=resolution_minutes)).strftime('%Y-%m-%dT%H:%M:%SZ')
+    return {
+        'ticket_id': ticket['id'],
+        'solved_at': solved_at,
+        'reopens': ticket['id'] % 3 if solved else 0,
+        'full_resolution_time_in_minutes': {'calendar': resolution_minutes, 'business': resolution_minutes}
+    }
+
+# Local HTTP stand-in for the Zendesk groups.json, search.json and tickets/show_many.json endpoints
+class ZendeskStandIn:
+    def __init__(self, tickets, rate_limit_every=0, retry_after=0, host='127.0.0.1', port=0):
+        self.tickets = tickets
+        self.created_keys = [ticket['created_at'] for ticket in tickets]
+        self.tickets_by_id = {ticket['id']: ticket for ticket in tickets}
+        self.rate_limit_every = rate_limit_every  # Answer every Nth request with a 429; 0 disables
+        self.retry_after = retry_after  # Retry-After header sent with injected 429s
+        self.lock = threading.Lock()
+        self.request_count = 0
+        self.rate_limited_count = 0
+        self.server = ThreadingHTTPServer((host, port), self.build_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    # Function to decide whether this request gets an injected 429
+    def take_request(self):
+        with self.lock:
+            self.request_count += 1
+            rate_limited = self.rate_limit_every > 0 and self.request_count % self.rate_limit_every == 0
+            if rate_limited:
+                self.rate_limited_count += 1
+            return rate_limited
+
+    # Function to find the tickets matching the created>/created< and group: filters of a search query
+    def search(self, query):
+        created_after = created_before = None
+        group_ids = set()
+        for term in query.split():
+            if term.startswith('created>'):
+                created_after = term[len('created>'):]
+            elif term.startswith('created<'):
+                created_before = term[len('created<'):]
+            elif term.startswith('group:'):
+                group_ids.add(int(term[len('group:'):]))
+        # Both bounds are exclusive, as in Zendesk
+        start = bisect.bisect_right(self.created_keys, created_after) if created_after else 0
+        end = bisect.bisect_left(self.created_keys, created_before) if created_before else len(self.tickets)
+        if group_ids:
+            # Repeated group: terms match any of the groups
+            return [ticket for ticket in self.tickets[start:end] if ticket['group_id'] in group_ids]
+        return self.tickets[start:end]
+
+    def build_handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def send_json(self, status, body, headers=None):
+                payload = json.dumps(body).encode('utf-8')
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(payload)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def do_GET(self):
+                if stand_in.take_request():
+                    self.send_json(429, {'error': 'TooManyRequests'}, {'Retry-After': str(stand_in.retry_after)})
+                    return
+
+                url = urlparse(self.path)
+                params = {name: values[0] for name, values in parse_qs(url.query).items()}
+
+                if url.path == '/api/v2/groups.json':
+                    # Paged like Zendesk, so callers have to follow next_page to see every group
+                    groups = [{'id': group_id, 'name': name} for group_id, name in synthetic_groups.items()]
+                    per_page = int(params.get('per_page', groups_per_page))
+                    page = int(params.get('page', 1))
+                    next_page = None
+                    if page * per_page < len(groups):
+                        next_page = f'{stand_in.base_url}{url.path}?' + urlencode(dict(params, page=page + 1))
+                    self.send_json(200, {'groups': groups[(page - 1) * per_page:page * per_page], 'next_page': next_page,
+                                         'count': len(groups)})
+                elif url.path == '/api/v2/search.json':
+                    matches = stand_in.search(params.get('query', ''))
+                    per_page = int(params.get('per_page', 100))
+                    page = int(params.get('page', 1))
+                    offset = (page - 1) * per_page
+                    if offset >= max_search_results:
+                        self.send_json(422, {'error': 'InvalidPaginationParameter',
+                                             'description': f'Only the first {max_search_results} results can be paged through'})
+                        return
+                    results = matches[offset:min(offset + per_page, max_search_results)]
+                    next_page = None
+                    if offset + per_page < min(len(matches), max_search_results):
+                        next_page = f'{stand_in.base_url}{url.path}?' + urlencode(dict(params, page=page + 1))
+                    self.send_json(200, {'results': results, 'next_page': next_page, 'count': len(matches)})
+                elif url.path == '/api/v2/tickets/show_many.json':
+                    tickets = [stand_in.tickets_by_id[int(ticket_id)] for ticket_id in params.get('ids', '').split(',')
+                               if ticket_id and int(ticket_id) in stand_in.tickets_by_id]
+                    body = {'tickets': tickets}
+                    if 'metric_sets' in params.get('include', ''):
+                        body['metric_sets'] = [build_metric_set(ticket) for ticket in tickets]
+                    self.send_json(200, body)
+                else:
+                    self.send_json(404, {'error': 'InvalidEndpoint'})
+
+            # Keep the benchmark output readable
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+if __name__ == "__main__":
+    end_date = datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    stand_in = ZendeskStandIn(generate_tickets(1000, end_date - timedelta(days=1), end_date), rate_limit_every=10)
+    print(f"Serving 1000 synthetic tickets at {stand_in.base_url} (every 10th request is a 429). Press Ctrl+C to stop.")
+    try:
+        stand_in.server.serve_forever()
+    except KeyboardInterrupt:
+        stand_in.server.server_close()
@@ -0,0 +1,92 @@
+import os
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import pandas as pd
+import extract
+import organize
+import aggregate
+import rollup_cube
+from classification_cache import ClassificationCache
+from project_config import config
+
+tenants_dir = 'tenants'  # One directory per tenant with its aggregated CSV, group cache and rollup cube
+combined_output_path = os.path.join(tenants_dir, 'tenants_aggregated_data.csv')  # Every tenant's tickets aggregated together, out of reach of main.delete_files
+shared_fetch_workers = 8  # Search windows of all tenants run on this one pool and its per-thread sessions
+
+# Function to build the tenant profiles listed under 'tenants' in project_config. Each entry needs name, subdomain,
+# email and api_token, and may set allowed_group_names, the custom field IDs and requests_per_minute.
+def load_profiles(tenant_configs, output_dir=tenants_dir):
+    profiles = []
+    for tenant_config in tenant_configs:
+        tenant_dir = os.path.join(output_dir, tenant_config['name'])
+        os.makedirs(tenant_dir, exist_ok=True)
+        profiles.append(extract.build_profile(group_cache_path=os.path.join(tenant_dir, 'group_cache.json'), **tenant_config))
+    return profiles
+
+# Function to fetch one tenant's tickets under its own request budget, on the shared window pool
+def fetch_tenant(profile, start_date, end_date, executor):
+    group_map = extract.load_group_map(profile=profile)
+    rate_limiter = extract.RateLimiter(profile['requests_per_minute'])
+    tickets = extract.fetch_tickets_for_date_range(start_date, end_date, group_map, write_csv=False, rate_limiter=rate_limiter,
+                                                   raise_errors=True, profile=profile, executor=executor)
+    return tickets.to_frame()
+
+# Function to organize and aggregate one tenant's tickets and save them in the tenant's directory
+def aggregate_tenant(name, extracted_df, cache, output_dir=tenants_dir):
+    organized_df = organize.organize_tickets(extracted_df, cache)
+    aggregated_df = aggregate.aggregate_tickets(organized_df)
+
+    tenant_dir = os.path.join(output_dir, name)
+    aggregated_df.to_csv(os.path.join(tenant_dir, aggregate.aggregated_output_path), index=False)
+    if aggregate.update_rollup_cube:
+        rollup_cube.refresh_cube(aggregated_df, os.path.join(tenant_dir, rollup_cube.rollup_cube_path))
+    print(f"Tenant {name}: {len(extracted_df)} tickets aggregated into {len(aggregated_df)} rows")
+    return organized_df
+
+# Entry point: fetch every tenant concurrently, then aggregate each tenant and all tenants combined
+def run_tenants(profiles, start_date, end_date, output_dir=tenants_dir, combined_path=combined_output_path):
+    extracted = {}
+    failed = []
+
+    # Fetching is network-bound, so the tenants run side by side; each one waits only on its own budget
+    with ThreadPoolExecutor(max_workers=shared_fetch_workers) as window_executor, \
+            ThreadPoolExecutor(max_workers=len(profiles)) as tenant_executor:
+        futures = {profile['name']: tenant_executor.submit(fetch_tenant, profile, start_date, end_date, window_executor)
+                   for profile in profiles}
+        for name, future in futures.items():
+            try:
+                extracted[name] = future.result()
+            except Exception as e:
+                print(f"Tenant {name} failed: {e}")
+                failed.append(name)
+
+    # Classification is CPU-bound, so the tenants share one cache and run one after another
+    cache = ClassificationCache(organize.keyword_tables_hash) if organize.use_classification_cache else None
+    try:
+        organized = [aggregate_tenant(name, extracted_df, cache, output_dir) for name, extracted_df in extracted.items()]
+    finally:
+        if cache is not None:
+            cache.report()
+            cache.close()
+
+    combined_df = None
+    if organized:
+        combined_df = aggregate.aggregate_tickets(pd.concat(organized, ignore_index=True))
+        os.makedirs(os.path.dirname(combined_path) or '.', exist_ok=True)
+        combined_df.to_csv(combined_path, index=False)
+        print(f"Combined {len(organized)} tenants into {combined_path}")
+
+    if failed:
+        print(f"{len(failed)} tenants failed: {', '.join(failed)}. Their outputs were not updated.")
+    return combined_df, failed
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run extract, organize and aggregate for every tenant in project_config's 'tenants'")
+    parser.add_argument('--start-date', help='first day to fetch (YYYY-MM-DD), default yesterday')
+    parser.add_argument('--end-date', help='day after the last day to fetch (YYYY-MM-DD), default today')
+    args = parser.parse_args()
+
+    end_date = datetime.strptime(args.end_date, '%Y-%m-%d') if args.end_date else datetime.utcnow().replace(hour=0, minute=0, second=0, microsecond=0)
+    start_date = datetime.strptime(args.start_date, '%Y-%m-%d') if args.start_date else end_date - timedelta(days=1)
+    run_tenants(load_profiles(config['tenants']), start_date, end_date)
@@ -0,0 +1,32 @@
+import os
+import sys
+import types
+import pytest
+
+# The pipeline modules import each other by name, so put the equipment_analysis directory on the path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Test settings in place of the local project_config, so no test can reach a real Zendesk or SharePoint tenant
+test_config = types.ModuleType('project_config')
+test_config.zendesk_api_token = 'test-token'
+test_config.zendesk_api_url = 'http://127.0.0.1:9/api/v2'
+test_config.zendesk_email = 'tests@example.com'
+test_config.zendesk_subdomain = 'example'
+test_config.product_service_desk_tool_id = 1001
+test_config.action_taken_id = 1002
+test_config.site_url = 'http://127.0.0.1:9/sites/operations'
+test_config.client_id = 'test-client'
+test_config.client_secret = 'test-secret'
+test_config.tenant_id = 'test-tenant'
+test_config.target_file_name = 'zendesk_ticket_analysis.xlsx'
+test_config.sheet_name = 'Sheet1'
+test_config.onedrive_path = 'onedrive'
+test_config.folder_url = '/sites/operations/Shared Documents/Equipment'
+test_config.config = {'scripts': ['extract.py', 'organize.py', 'aggregate.py', 'convert.py'], 'csv_files': []}
+sys.modules['project_config'] = test_config
+
+# Every stage writes its files and caches to the working directory, so each test gets its own
+@pytest.fixture(autouse=True)
+def work_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    return tmp_path
@@ -0,0 +1,77 @@
+import os
+import sqlite3
+from datetime import datetime
+import pandas as pd
+import pytest
+import aggregate
+import extract
+import organize
+import pipeline
+import synthetic_zendesk
+from ticket_store import TicketStore
+
+# Function to build an extracted batch of laptop returns, one per (ticket ID, created date) pair
+def ticket_batch(tickets):
+    data = {column: [] for column in extract.TicketBatch.columns}
+    for ticket_id, (year, month, day) in tickets:
+        values = {'Ticket ID': ticket_id, 'Ticket subject': 'Laptop return', 'Ticket group': 'Equipment', 'Tickets': 1,
+                  'Ticket created - Day of month': day, 'Ticket created - Month': month, 'Ticket created - Year': year}
+        for column in extract.TicketBatch.columns:
+            data[column].append(values.get(column))
+    return extract.TicketBatch(data)
+
+def test_ticket_store_run_totals_each_day_on_its_own():
+    store = TicketStore()
+    try:
+        store.upsert_many(ticket_batch([(1, (2024, 1, 1)), (2, (2024, 1, 20)), (3, (2024, 1, 20))]))
+    finally:
+        store.close()
+
+    results, failed = pipeline.run_pipeline(['organize', 'aggregate'], use_ticket_store=True, write_artifacts=False)
+
+    assert not failed
+    aggregated_df = results['aggregate']
+    total_rows = aggregated_df[aggregated_df['Ticket subject'] == 'Total']
+    assert list(zip(total_rows['Date'], total_rows['Tickets'])) == [('2024-01-01', 1), ('2024-01-20', 2)]
+    status_rows = aggregated_df[aggregated_df['Ticket subject'] == 'Status Total']
+    assert list(zip(status_rows['Date'], status_rows['Tickets'])) == [('2024-01-01', 1), ('2024-01-20', 2)]
+
+# Function to write an extracted_data.csv of synthetic tickets spread over a week, with a few rows whose dates
+# are invalid or spelled out, to the given directory
+def write_extracted_csv(directory, count=3000):
+    raw_tickets = synthetic_zendesk.generate_tickets(count, datetime(2024, 1, 1), datetime(2024, 1, 8), seed=7)
+    metric_sets = {ticket['id']: synthetic_zendesk.build_metric_set(ticket) for ticket in raw_tickets}
+    extracted_df = extract.process_tickets(raw_tickets, dict(synthetic_zendesk.synthetic_groups), metric_sets).to_frame()
+    extracted_df = extracted_df.astype({'Ticket created - Day of month': object, 'Ticket created - Month': object})
+    extracted_df.loc[::97, 'Ticket created - Day of month'] = 'x'
+    extracted_df.loc[::89, 'Ticket created - Month'] = 'January'
+    os.makedirs(directory)
+    extracted_df.to_csv(os.path.join(directory, organize.ticket_data_path), index=False)
+
+def read_bytes(path):
+    with open(path, 'rb') as data_file:
+        return data_file.read()
+
+def read_cube(directory):
+    connection = sqlite3.connect(os.path.join(directory, 'rollup_cube.sqlite'))
+    try:
+        return connection.execute('SELECT * FROM cube ORDER BY date, status, category').fetchall()
+    finally:
+        connection.close()
+
+@pytest.mark.parametrize('organize_chunk_size, aggregate_chunk_size', [(500, 500), (333, 1000), (10000, 257)])
+def test_chunked_runs_write_the_same_files(work_dir, monkeypatch, organize_chunk_size, aggregate_chunk_size):
+    write_extracted_csv(work_dir / 'whole')
+    write_extracted_csv(work_dir / 'chunked')
+
+    monkeypatch.chdir(work_dir / 'whole')
+    organize.main()
+    aggregate.main()
+    monkeypatch.chdir(work_dir / 'chunked')
+    organize.main(chunk_size=organize_chunk_size)
+    aggregate.main(chunk_size=aggregate_chunk_size)
+
+    for path in [organize.updated_ticket_data_path, aggregate.aggregated_output_path]:
+        assert read_bytes(work_dir / 'chunked' / path) == read_bytes(work_dir / 'whole' / path), path
+    assert read_cube(work_dir / 'chunked') == read_cube(work_dir / 'whole') != []
+    assert len(pd.read_csv(work_dir / 'whole' / aggregate.aggregated_output_path)) > 2000
@@ -0,0 +1,142 @@
+import threading
+from datetime import datetime, timedelta
+import pandas as pd
+import pytest
+import backfill
+import extract
+import pipeline
+
+group_map = {360001: 'Equipment'}
+start_time = datetime(2024, 1, 1)
+
+class FakeResponse:
+    status_code = 200
+    text = ''
+
+    def __init__(self, body):
+        self.body = body
+
+    def json(self):
+        return self.body
+
+def export_ticket(ticket_id, updated_at):
+    return {'id': ticket_id, 'subject': 'Laptop return', 'group_id': 360001, 'status': 'open',
+            'created_at': '2024-01-01T05:00:00Z', 'updated_at': updated_at, 'custom_fields': []}
+
+def metric_set(ticket_id, solved_at=None):
+    return {'ticket_id': ticket_id, 'solved_at': solved_at, 'reopens': 0, 'full_resolution_time_in_minutes': {}}
+
+def serve_page(monkeypatch, tickets, metric_sets):
+    page = {'tickets': tickets, 'metric_sets': metric_sets, 'end_of_stream': True, 'after_cursor': 'cursor'}
+    # Keep the 2024 test tickets inside the retention window
+    monkeypatch.setattr(extract, 'incremental_retention_days', 100000)
+    monkeypatch.setattr(extract, 'get_with_rate_limit', lambda url, rate_limiter: FakeResponse(page))
+
+# Function to run one incremental export whose single page holds the given tickets and metric sets,
+# committing its checkpoint as a successful pipeline run would
+def run_export(monkeypatch, tickets, metric_sets, commit=True):
+    serve_page(monkeypatch, tickets, metric_sets)
+    fetched = extract.fetch_incremental_tickets(group_map, start_time, write_csv=False)
+    if commit:
+        extract.commit_state()
+    return fetched
+
+def test_incremental_export_re_emits_changed_tickets(monkeypatch):
+    run_export(monkeypatch, [export_ticket(1, '2024-01-01T06:00:00Z'), export_ticket(2, '2024-01-01T06:00:00Z')],
+               [metric_set(1), metric_set(2)])
+
+    tickets, delta = run_export(monkeypatch, [export_ticket(2, '2024-01-01T09:00:00Z'), export_ticket(3, '2024-01-01T09:00:00Z')],
+                                [metric_set(2, '2024-01-01T09:00:00Z'), metric_set(3)])
+
+    # The ticket store gets the changed ticket with its current values
+    assert tickets.data['Ticket ID'] == [2, 3]
+    assert tickets.data['Ticket solved - Date'] == ['2024-01-01', None]
+    # The delta adds the solve without counting ticket 2 a second time
+    assert delta.data['Ticket ID'] == [2, 3]
+    assert delta.data['Tickets'] == [0, 1]
+    assert delta.data['Ticket solved - Date'] == ['2024-01-01', None]
+
+def test_incremental_export_counts_a_solve_once(monkeypatch):
+    run_export(monkeypatch, [export_ticket(1, '2024-01-01T06:00:00Z')], [metric_set(1, '2024-01-01T06:00:00Z')])
+
+    tickets, delta = run_export(monkeypatch, [export_ticket(1, '2024-01-01T08:00:00Z')], [metric_set(1, '2024-01-01T06:00:00Z')])
+
+    assert len(tickets) == 1
+    assert len(delta) == 0
+
+def test_incremental_export_skips_repeated_updates(monkeypatch):
+    run_export(monkeypatch, [export_ticket(1, '2024-01-01T06:00:00Z')], [metric_set(1)])
+
+    tickets, delta = run_export(monkeypatch, [export_ticket(1, '2024-01-01T06:00:00Z')], [metric_set(1)])
+
+    assert len(tickets) == 0
+    assert len(delta) == 0
+
+def test_incremental_export_reads_checkpoints_without_update_times(monkeypatch):
+    extract.save_state({'cursor': 'cursor', 'high_water': '2024-01-01T06:00:00Z', 'created_floor': '2024-01-01T00:00:00Z',
+                        'emitted_ids': {'1': '2024-01-01T05:00:00Z'}})
+
+    tickets, delta = run_export(monkeypatch, [export_ticket(1, '2024-01-01T07:00:00Z')], [metric_set(1)])
+
+    assert tickets.data['Ticket ID'] == [1]
+    assert len(delta) == 0
+    assert extract.load_state()['emitted_ids']['1'] == ['2024-01-01T05:00:00Z', '2024-01-01T07:00:00Z', False]
+
+def test_uncommitted_export_is_fetched_again(monkeypatch):
+    run_export(monkeypatch, [export_ticket(1, '2024-01-01T06:00:00Z')], [metric_set(1)], commit=False)
+
+    tickets, delta = run_export(monkeypatch, [export_ticket(1, '2024-01-01T06:00:00Z')], [metric_set(1)])
+
+    assert delta.data['Ticket ID'] == [1]
+    assert extract.load_state()['emitted_ids']['1'] == ['2024-01-01T05:00:00Z', '2024-01-01T06:00:00Z', False]
+
+# Function to run extract and a stand-in upload stage through the pipeline in incremental mode
+def run_incremental_pipeline(monkeypatch, upload_fails):
+    def upload_stage(extracted_df, options):
+        if upload_fails:
+            raise RuntimeError('SharePoint unavailable')
+
+    monkeypatch.setattr(extract, 'load_group_map', lambda refresh=False: group_map)
+    monkeypatch.setattr(pipeline, 'stages', {'extract': ([], pipeline.run_extract), 'upload': (['extract'], upload_stage)})
+    return pipeline.run_pipeline(['extract', 'upload'], incremental=True, write_artifacts=False)
+
+def test_failed_pipeline_run_keeps_the_previous_checkpoint(monkeypatch):
+    # extract.main exports from the start of yesterday
+    updated_at = extract.format_search_time(datetime.utcnow() - timedelta(hours=1))
+    serve_page(monkeypatch, [dict(export_ticket(1, updated_at), created_at=updated_at)], [metric_set(1)])
+
+    _, failed = run_incremental_pipeline(monkeypatch, upload_fails=True)
+
+    assert failed == {'upload'}
+    assert extract.load_state() == {}
+    _, failed = run_incremental_pipeline(monkeypatch, upload_fails=False)
+    assert not failed
+    assert list(extract.load_state()['emitted_ids']) == ['1']
+
+def process(ticket_ids, updated_at='2024-01-01T06:00:00Z'):
+    return extract.process_tickets([export_ticket(ticket_id, updated_at) for ticket_id in ticket_ids], group_map, {})
+
+# Function to serve the given batch for each search window start and nothing for the other windows
+def serve_windows(monkeypatch, batches_by_start):
+    monkeypatch.setattr(extract, 'fetch_time_slice', lambda slice_start, *args: batches_by_start.get(slice_start, extract.TicketBatch()))
+
+def test_date_range_csv_holds_each_ticket_once(monkeypatch):
+    # Ticket 2 shows up in two windows, and ticket 3 twice in one
+    serve_windows(monkeypatch, {start_time: process([1, 2, 3, 3]), start_time + timedelta(hours=1): process([2, 4])})
+    pd.DataFrame({'stale': [1]}).to_csv('extracted_data.csv', index=False)
+
+    tickets = extract.fetch_tickets_for_date_range(start_time, start_time + timedelta(days=1), group_map)
+
+    assert sorted(tickets.data['Ticket ID']) == [1, 2, 3, 4]
+    written_df = pd.read_csv('extracted_data.csv')
+    assert list(written_df.columns) == extract.extracted_columns
+    assert len(written_df) == 4
+
+def test_backfill_partition_counts_each_ticket_once(monkeypatch, tmp_path):
+    serve_windows(monkeypatch, {start_time: process([1, 2, 3, 3]), start_time + timedelta(hours=1): process([2, 4])})
+
+    partition_path = backfill.run_partition(start_time, start_time + timedelta(days=1), group_map, threading.Lock(),
+                                            {'next_slot': 0.0, 'blocked_until': 0.0}, output_dir=str(tmp_path))
+
+    aggregated_df = pd.read_csv(partition_path, keep_default_na=False)
+    assert aggregated_df.loc[aggregated_df['Ticket subject'] == 'Total', 'Tickets'].tolist() == [4]
@@ -0,0 +1,19 @@
+import os
+import backfill
+import page_archive
+import tenants
+import main
+
+def test_delete_files_keeps_merged_outputs(work_dir, monkeypatch):
+    # delete_files cleans the directory main.py lives in
+    monkeypatch.setattr(main, '__file__', str(work_dir / 'main.py'))
+    kept_paths = [backfill.backfill_output_path, page_archive.replay_output_path, tenants.combined_output_path, 'zendesk_ticket_analysis.xlsx']
+    for path in kept_paths + ['extracted_data.csv', 'aggregated_data.xlsx']:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        open(path, 'w').close()
+
+    main.delete_files([])
+
+    assert all(os.path.exists(path) for path in kept_paths)
+    assert not os.path.exists('extracted_data.csv')
+    assert not os.path.exists('aggregated_data.xlsx')
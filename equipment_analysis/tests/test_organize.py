@@ -0,0 +1,112 @@
+import random
+import numpy as np
+import pandas as pd
+import pytest
+import organize
+import synthetic_zendesk
+from classification_cache import ClassificationCache, normalize_subject
+
+# Subjects the compiled tables are most likely to get wrong: case, line breaks, keywords at either end,
+# keywords that only match with a space, and labels whose keywords overlap
+edge_case_subjects = [
+    '',
+    ' ',
+    'LAPTOP RETURN',
+    'laptop\nreturn',
+    'Return\r\nof a laptop',
+    'laptop',
+    'return',
+    'New Hire',
+    'new\nhire laptop',
+    'Desk top setup',
+    'Desk  top setup',
+    'land line request',
+    'land  line request',
+    'deskphone broke',
+    'cell phone shipped',
+    'Phone returned (termed)',
+    'HP',
+    'hp chromebook pickup',
+    'Acquisition of monitors',
+    'Shipping address for the new hire',
+    'Broken screen',
+    'nothing that matches',
+    'über laptop',
+    '\tmonitor\t',
+]
+
+def generate_subjects(count, seed=0):
+    rng = random.Random(seed)
+    return [synthetic_zendesk.generate_subject(rng) for _ in range(count)] + edge_case_subjects
+
+def reference_labels(subject):
+    return organize.determine_category(subject), organize.determine_status(subject)
+
+@pytest.mark.parametrize('subject', edge_case_subjects)
+def test_classify_subject_matches_reference(subject):
+    assert organize.classify_subject(subject) == reference_labels(subject)
+
+def test_classify_subject_matches_reference_on_generated_subjects():
+    for subject in set(generate_subjects(5000)):
+        assert organize.classify_subject(subject) == reference_labels(subject), subject
+
+def test_classify_subjects_matches_reference_column():
+    subjects = pd.Series(generate_subjects(2000) + [np.nan, None], dtype=object)
+
+    categories, statuses = organize.classify_subjects(subjects)
+
+    pd.testing.assert_series_equal(categories, subjects.apply(organize.determine_category), check_names=False)
+    pd.testing.assert_series_equal(statuses, subjects.apply(organize.determine_status), check_names=False)
+
+# Subjects that share a cache key with another subject in different ASCII case or with surrounding whitespace
+def add_key_variants(subjects):
+    return subjects + [subject.upper() for subject in subjects] + ['  ' + subject + '\n' for subject in subjects]
+
+def test_normalized_key_classifies_like_its_subjects():
+    for subject in set(add_key_variants(generate_subjects(2000))):
+        assert organize.classify_subject(normalize_subject(subject)) == organize.classify_subject(subject), subject
+
+def test_cached_classification_matches_reference():
+    subjects = pd.Series(add_key_variants(generate_subjects(2000)), dtype=object)
+    expected_categories = subjects.apply(organize.determine_category)
+    expected_statuses = subjects.apply(organize.determine_status)
+
+    # The first pass fills the cache, the second answers from memory and the third from SQLite alone
+    cache = ClassificationCache(organize.keyword_tables_hash, 'classification_cache.sqlite')
+    try:
+        for _ in range(2):
+            categories, statuses = organize.classify_subjects(subjects, cache)
+            pd.testing.assert_series_equal(categories, expected_categories, check_names=False)
+            pd.testing.assert_series_equal(statuses, expected_statuses, check_names=False)
+    finally:
+        cache.close()
+    cache = ClassificationCache(organize.keyword_tables_hash, 'classification_cache.sqlite')
+    try:
+        categories, statuses = organize.classify_subjects(subjects, cache)
+        assert cache.misses == 0
+    finally:
+        cache.close()
+    pd.testing.assert_series_equal(categories, expected_categories, check_names=False)
+    pd.testing.assert_series_equal(statuses, expected_statuses, check_names=False)
+
+@pytest.mark.parametrize('subject, labels', [
+    ('Desk  top setup', ('Other', 'Picked up/Shipped')),
+    ('land  line request', ('Other', 'Picked up/Shipped')),
+])
+def test_cache_keys_keep_inner_whitespace(subject, labels):
+    cache = ClassificationCache(organize.keyword_tables_hash, 'classification_cache.sqlite')
+    try:
+        # Seed the cache with the single-spaced spelling first, which does match a keyword
+        organize.classify_subjects(pd.Series([' '.join(subject.split())]), cache)
+        categories, statuses = organize.classify_subjects(pd.Series([subject]), cache)
+    finally:
+        cache.close()
+    assert (categories[0], statuses[0]) == labels == organize.classify_subject(subject)
+
+def test_organize_tickets_treats_empty_subjects_as_missing():
+    df = pd.DataFrame({'Ticket subject': ['', np.nan, 'laptop return'], 'Tickets': [1, 1, 1]})
+
+    organized_df = organize.organize_tickets(df)
+
+    assert list(organized_df['Equipment Category']) == ['Other', 'Other', 'Laptop']
+    assert list(organized_df['Equipment Status']) == ['Other', 'Other', 'Returned']
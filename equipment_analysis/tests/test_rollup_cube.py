@@ -0,0 +1,46 @@
+import pandas as pd
+import aggregate
+import extract
+import organize
+import rollup_cube
+
+# Function to build the aggregated rows of one day with the given number of returned laptops
+def day_rows(day, ticket_count):
+    ticket_rows = pd.DataFrame({'Date': [day] * ticket_count, 'Ticket subject': [f'Laptop return {number}' for number in range(ticket_count)],
+                                'Tickets': [1] * ticket_count, 'Equipment Status': ['Returned'] * ticket_count,
+                                'Equipment Category': ['Laptop'] * ticket_count, 'Solved Tickets': [0] * ticket_count})
+    return pd.concat([ticket_rows, aggregate.build_total_rows(aggregate.partial_totals(ticket_rows))], ignore_index=True)
+
+def query_tickets():
+    cube = rollup_cube.RollupCube()
+    try:
+        return cube.query('2024-01-01', '2024-01-01')['tickets'].tolist()
+    finally:
+        cube.close()
+
+def test_complete_days_replace_their_cells():
+    rollup_cube.refresh_cube(day_rows('2024-01-01', 5))
+
+    rollup_cube.refresh_cube(day_rows('2024-01-01', 2))
+
+    assert query_tickets() == [2]
+
+def test_partial_days_add_to_their_cells():
+    rollup_cube.refresh_cube(day_rows('2024-01-01', 5), partial_days=True)
+
+    rollup_cube.refresh_cube(day_rows('2024-01-01', 2), partial_days=True)
+
+    assert query_tickets() == [7]
+
+def test_chunked_aggregate_adds_partial_days(monkeypatch):
+    monkeypatch.setattr(aggregate, 'update_rollup_cube', True)
+    rollup_cube.refresh_cube(day_rows('2024-01-01', 5))
+    extracted_df = pd.DataFrame({column: [None] * 2 for column in extract.extracted_columns})
+    extracted_df = extracted_df.assign(**{'Ticket subject': ['Laptop return'] * 2, 'Tickets': [1] * 2, 'Ticket created - Day of month': [1] * 2,
+                                          'Ticket created - Month': [1] * 2, 'Ticket created - Year': [2024] * 2})
+    organized_df = organize.organize_tickets(extracted_df)
+    organized_df.to_csv('organized_data.csv', index=False)
+
+    aggregate.aggregate_csv_in_chunks('organized_data.csv', 'aggregated_data.csv', 1, partial_days=True)
+
+    assert query_tickets() == [7]
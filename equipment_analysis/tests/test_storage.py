@@ -0,0 +1,35 @@
+import pandas as pd
+import pytest
+import storage
+
+pytest.importorskip('pyarrow')
+
+def build_extracted_frame():
+    return pd.DataFrame({
+        'Product - Service Desk Tool': ['laptop', 'No Product', 'laptop'],
+        'Action Taken': ['returned', 'No Action', 'shipped'],
+        'Ticket group': ['Equipment', 'Equipment Waiting', 'Equipment'],
+        'Ticket subject': ['Laptop return', '', 'Ship monitor'],
+        'Ticket created - Day of month': [1, 2, 3],
+        'Ticket created - Month': [1, 1, 1],
+        'Ticket created - Year': [2024, 2024, 2024],
+        'Tickets': [1, 1, 1],
+        'Ticket solved - Date': ['2024-01-02', None, None],
+        'Reopens': [0, None, None],
+        'Full resolution time (minutes)': [90, None, None]
+    })
+
+@pytest.mark.parametrize('file_format', ['arrow', 'parquet'])
+def test_read_frame_keeps_the_written_schema(file_format):
+    df = build_extracted_frame()
+
+    storage.write_frame(df, 'extracted_data', file_format)
+    read_df = storage.read_frame('extracted_data', file_format)
+
+    for column, dtype in storage.extracted_schema.items():
+        if dtype == 'string':
+            # Strings stay Arrow-backed instead of becoming Python objects
+            assert read_df[column].dtype == pd.StringDtype('pyarrow'), column
+        else:
+            assert str(read_df[column].dtype) == dtype, column
+    pd.testing.assert_frame_equal(read_df, storage.apply_schema(df, storage.extracted_schema), check_dtype=False)
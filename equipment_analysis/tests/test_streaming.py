@@ -0,0 +1,50 @@
+from datetime import datetime
+import pandas as pd
+import aggregate
+import extract
+import organize
+import rollup_cube
+import streaming
+import synthetic_zendesk
+from test_aggregate import ticket_batch
+
+# Function to build a batch whose tickets carry the given subjects, all created on 2024-01-01
+def subject_batch(tickets):
+    batch = ticket_batch([(ticket_id, (2024, 1, 1)) for ticket_id, _ in tickets])
+    batch.data['Ticket subject'] = [subject for _, subject in tickets]
+    return batch
+
+# Function to aggregate pages the way the batch path does: merged in fetch order, deduplicated, organized, aggregated
+def batch_result(pages):
+    merged = extract.TicketBatch()
+    for _, batch in sorted(pages, key=lambda page: page[0]):
+        merged.extend(batch)
+    return aggregate.aggregate_tickets(organize.organize_tickets(extract.dedupe_tickets(merged).to_frame()))
+
+def test_repeated_ticket_keeps_its_latest_copy():
+    # Ticket 2 changed between pages, and the later page arrives first
+    pages = [((1, 0), subject_batch([(2, 'Monitor shipped'), (4, 'Laptop return')])),
+             ((0, 0), subject_batch([(1, 'New hire laptop'), (2, 'Laptop return'), (3, 'Broken phone screen')])),
+             ((0, 1), subject_batch([(3, 'Broken phone screen')]))]
+    aggregator = streaming.PageAggregator()
+    aggregator.add(pages[:1], None)
+    aggregator.add(pages[1:], None)
+
+    pd.testing.assert_frame_equal(aggregator.result(), batch_result(pages))
+    assert aggregator.ticket_count == 4
+
+def test_stream_date_range_matches_the_batch_path(monkeypatch):
+    start_date, end_date = datetime(2024, 1, 1), datetime(2024, 1, 3)
+    tickets = synthetic_zendesk.generate_tickets(3000, start_date, end_date, seed=3)
+    # Every 7th request is a 429, so some pages are fetched again after a retry
+    with synthetic_zendesk.ZendeskStandIn(tickets, rate_limit_every=7) as stand_in:
+        monkeypatch.setattr(extract, 'base_url', stand_in.base_url)
+        group_map = extract.fetch_groups()
+        fetched = extract.fetch_tickets_for_date_range(start_date, end_date, group_map, write_csv=False,
+                                                       rate_limiter=extract.RateLimiter(1000000), raise_errors=True)
+        streamed_df, cells = streaming.stream_date_range(start_date, end_date, group_map, rate_limiter=extract.RateLimiter(1000000))
+
+    expected_df = aggregate.aggregate_tickets(organize.organize_tickets(fetched.to_frame()))
+    assert len(fetched) > 2000
+    pd.testing.assert_frame_equal(streamed_df, expected_df)
+    pd.testing.assert_frame_equal(cells, rollup_cube.build_cells(expected_df))
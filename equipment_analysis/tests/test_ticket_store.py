@@ -0,0 +1,61 @@
+from ticket_store import TicketStore
+from test_aggregate import ticket_batch
+
+def test_upsert_only_counts_new_or_changed_tickets():
+    store = TicketStore()
+    try:
+        assert store.upsert_many(ticket_batch([(1, (2024, 1, 1)), (2, (2024, 1, 2))])) == 2
+        assert store.get_meta('last_change_seq') == 1
+
+        # The same tickets again change nothing and do not use up a change sequence number
+        assert store.upsert_many(ticket_batch([(1, (2024, 1, 1)), (2, (2024, 1, 2))])) == 0
+        assert store.get_meta('last_change_seq') == 1
+
+        changed = ticket_batch([(2, (2024, 1, 2)), (3, (2024, 1, 3))])
+        changed.data['Ticket subject'][0] = 'Monitor return'
+        assert store.upsert_many(changed) == 2
+        change_seqs = dict(store.connection.execute('SELECT ticket_id, change_seq FROM tickets'))
+        assert change_seqs == {1: 1, 2: 2, 3: 2}
+    finally:
+        store.close()
+
+def test_watermark_only_moves_past_what_was_read():
+    store = TicketStore()
+    try:
+        store.upsert_many(ticket_batch([(1, (2024, 1, 1)), (2, (2024, 1, 2)), (3, (2024, 1, 2))]))
+        assert list(store.read_pending()['Ticket subject']) == ['Laptop return'] * 3
+        assert store.get_meta('pending_watermark') == 1
+        assert store.get_meta('watermark') == 0
+
+        # A change made after read_pending stays pending when the watermark advances
+        store.upsert_many(ticket_batch([(4, (2024, 1, 3))]))
+        store.advance_watermark()
+        assert store.get_meta('watermark') == 1
+        assert len(store.read_pending()) == 1
+        store.advance_watermark()
+        assert store.read_pending().empty
+
+        # One changed ticket reads its whole day back
+        changed = ticket_batch([(3, (2024, 1, 2))])
+        changed.data['Ticket subject'][0] = 'Monitor return'
+        store.upsert_many(changed)
+        assert list(store.read_pending()['Ticket subject']) == ['Laptop return', 'Monitor return']
+    finally:
+        store.close()
+
+def test_unadvanced_watermark_reads_the_same_days_again():
+    store = TicketStore()
+    try:
+        store.upsert_many(ticket_batch([(1, (2024, 1, 1))]))
+        assert len(store.read_pending()) == 1
+    finally:
+        store.close()
+
+    # A failed run never advances the watermark, so the next run gets the same tickets
+    store = TicketStore()
+    try:
+        assert len(store.read_pending()) == 1
+        store.advance_watermark()
+        assert store.read_pending().empty
+    finally:
+        store.close()
@@ -0,0 +1,211 @@
+import os
+import subprocess
+import openpyxl
+import pytest
+import requests
+from office365.sharepoint.client_context import ClientContext
+import pipeline
+import upload
+from synthetic_sharepoint import SharePointStandIn
+from ticket_store import TicketStore
+
+columns = ['Date', 'Ticket subject', 'Tickets', 'Equipment Status', 'Equipment Category', 'Solved Tickets']
+
+# Function to build the aggregated rows of one day: its tickets, a status total and the total row
+def day_rows(day, ticket_count):
+    rows = [[day, f'Laptop return {number}', 1, 'Returned', 'Laptop', 0] for number in range(ticket_count)]
+    return rows + [[day, 'Status Total', ticket_count, 'Returned', 'Laptop', 0], [day, 'Total', ticket_count, '', '', 0]]
+
+def read_sheet(path, sheet_name='Sheet1'):
+    workbook = openpyxl.load_workbook(path, read_only=True)
+    try:
+        return [list(row) for row in workbook[sheet_name].iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+
+def read_summary():
+    return {(partition, status, category or ''): tickets for partition, status, category, tickets in read_sheet('target_summary.xlsx', 'Summary')[1:]}
+
+def test_complete_day_already_uploaded_is_skipped():
+    upload.append_partitioned(columns, day_rows('2024-01-01', 3), '.', 'target.xlsx', 'Sheet1', 'month')
+    upload.append_partitioned(columns, day_rows('2024-01-02', 2), '.', 'target.xlsx', 'Sheet1', 'month')
+
+    upload.append_partitioned(columns, day_rows('2024-01-01', 4), '.', 'target.xlsx', 'Sheet1', 'month')
+
+    rows = read_sheet('target_2024-01.xlsx')
+    assert [row[0] for row in rows[1:]] == ['2024-01-01'] * 5 + [None] + ['2024-01-02'] * 4
+    assert read_summary() == {('2024-01', 'Returned', 'Laptop'): 5, ('2024-01', 'Total', ''): 5}
+
+def test_complete_day_replaces_its_earlier_rows_when_asked():
+    upload.append_partitioned(columns, day_rows('2024-01-01', 3), '.', 'target.xlsx', 'Sheet1', 'month')
+    upload.append_partitioned(columns, day_rows('2024-01-02', 2), '.', 'target.xlsx', 'Sheet1', 'month')
+
+    upload.append_partitioned(columns, day_rows('2024-01-01', 4), '.', 'target.xlsx', 'Sheet1', 'month', replace_days=True)
+
+    rows = read_sheet('target_2024-01.xlsx')
+    assert rows[0] == columns
+    assert [row[0] for row in rows[1:]] == ['2024-01-02'] * 4 + [None] + ['2024-01-01'] * 6
+    assert read_summary() == {('2024-01', 'Returned', 'Laptop'): 6, ('2024-01', 'Total', ''): 6}
+
+def test_partial_day_adds_to_its_earlier_rows():
+    upload.append_partitioned(columns, day_rows('2024-01-01', 3), '.', 'target.xlsx', 'Sheet1', 'month', partial_days=True)
+
+    upload.append_partitioned(columns, day_rows('2024-01-01', 2), '.', 'target.xlsx', 'Sheet1', 'month', partial_days=True)
+
+    rows = read_sheet('target_2024-01.xlsx')
+    assert len(rows) == 1 + 5 + 1 + 4
+    assert read_summary() == {('2024-01', 'Returned', 'Laptop'): 5, ('2024-01', 'Total', ''): 5}
+
+site_path = '/sites/operations'
+folder_url = f'{site_path}/Shared Documents/Equipment'
+workbook_content = bytes(range(256)) * 4096  # 1 MB, so the download spans many chunks
+
+# Sends MSAL's Azure AD requests to the stand-in
+class StandInSession(requests.Session):
+    def __init__(self, base_url):
+        super().__init__()
+        self.base_url = base_url
+
+    def request(self, method, url, *args, **kwargs):
+        return super().request(method, url.replace('https://login.microsoftonline.com', self.base_url), *args, **kwargs)
+
+@pytest.fixture
+def sharepoint():
+    with SharePointStandIn({f'{folder_url}/target.xlsx': workbook_content}, tenant_id='test-tenant') as stand_in:
+        yield stand_in
+
+def stand_in_context(sharepoint):
+    result = upload.acquire_access_token('client', 'secret', 'test-tenant', StandInSession(sharepoint.base_url))
+    return ClientContext(sharepoint.base_url + site_path).with_access_token(lambda: result), result['access_token']
+
+def read_cached_file():
+    with open(os.path.join(upload.download_cache_dir, 'target.xlsx'), 'rb') as cached_file:
+        return cached_file.read()
+
+def test_unchanged_file_is_not_downloaded_again(sharepoint):
+    ctx, access_token = stand_in_context(sharepoint)
+    upload.save_sharepoint_state({'server_relative_url': f'{folder_url}/target.xlsx'})
+
+    first_path = upload.download_target_file(ctx, sharepoint.base_url + site_path, access_token, folder_url, 'target.xlsx')
+    second_path = upload.download_target_file(ctx, sharepoint.base_url + site_path, access_token, folder_url, 'target.xlsx')
+
+    assert first_path == second_path
+    assert (sharepoint.download_count, sharepoint.not_modified_count) == (1, 1)
+    assert read_cached_file() == workbook_content
+
+def test_changed_file_is_downloaded_again(sharepoint):
+    ctx, access_token = stand_in_context(sharepoint)
+    upload.download_target_file(ctx, sharepoint.base_url + site_path, access_token, folder_url, 'target.xlsx')
+
+    sharepoint.files[f'{folder_url}/target.xlsx'] = b'changed workbook'
+    upload.download_target_file(ctx, sharepoint.base_url + site_path, access_token, folder_url, 'target.xlsx')
+
+    assert (sharepoint.download_count, sharepoint.not_modified_count) == (2, 0)
+    assert read_cached_file() == b'changed workbook'
+
+def test_missing_file_is_looked_up_in_its_folder(sharepoint):
+    moved_url = f'{folder_url}/target.xlsx'
+    ctx, access_token = stand_in_context(sharepoint)
+    # A URL remembered from before the file moved
+    upload.save_sharepoint_state({'server_relative_url': f'{site_path}/Shared Documents/Old/target.xlsx', 'etag': '"old"'})
+
+    path = upload.download_target_file(ctx, sharepoint.base_url + site_path, access_token, folder_url, 'target.xlsx')
+
+    assert read_cached_file() == workbook_content
+    assert path == os.path.join(upload.download_cache_dir, 'target.xlsx')
+    assert (sharepoint.not_found_count, sharepoint.folder_lookup_count, sharepoint.download_count) == (1, 1, 1)
+    assert upload.load_sharepoint_state()['server_relative_url'] == moved_url
+
+def test_file_missing_from_its_folder_returns_none(sharepoint):
+    ctx, access_token = stand_in_context(sharepoint)
+
+    path = upload.download_target_file(ctx, sharepoint.base_url + site_path, access_token, f'{site_path}/Shared Documents/Empty', 'target.xlsx')
+
+    assert path is None
+    assert sharepoint.folder_lookup_count == 1
+
+def test_download_streams_chunks_to_disk(sharepoint, monkeypatch):
+    ctx, access_token = stand_in_context(sharepoint)
+    chunk_sizes = []
+    iter_content = requests.Response.iter_content
+
+    # Record the chunks handed to stream_to_file, so the test can tell the body was not read whole
+    def recording_iter_content(response, chunk_size=1, decode_unicode=False):
+        for chunk in iter_content(response, chunk_size, decode_unicode):
+            chunk_sizes.append(len(chunk))
+            yield chunk
+
+    monkeypatch.setattr(upload, 'download_chunk_size', 4096)
+    monkeypatch.setattr(requests.Response, 'iter_content', recording_iter_content)
+    upload.download_target_file(ctx, sharepoint.base_url + site_path, access_token, folder_url, 'target.xlsx')
+
+    assert read_cached_file() == workbook_content
+    assert max(chunk_sizes) <= 4096
+    assert sum(chunk_sizes) == len(workbook_content)
+    assert not os.path.exists(os.path.join(upload.download_cache_dir, 'target.xlsx.tmp'))
+
+def test_token_is_reused_from_the_persisted_cache(sharepoint):
+    first = upload.acquire_access_token('client', 'secret', 'test-tenant', StandInSession(sharepoint.base_url))
+    # A fresh application, as in the next pipeline run, only has the cache file
+    second = upload.acquire_access_token('client', 'secret', 'test-tenant', StandInSession(sharepoint.base_url))
+
+    assert first['access_token'] == second['access_token']
+    assert sharepoint.token_request_count == 1
+    assert oct(os.stat(upload.token_cache_path).st_mode & 0o777) == oct(0o600)
+
+def test_token_failure_fails_the_upload(monkeypatch):
+    monkeypatch.setattr(upload, 'acquire_access_token', lambda *args: {'error': 'invalid_client', 'error_description': 'Bad secret'})
+
+    with pytest.raises(RuntimeError, match='invalid_client'):
+        upload.sync_and_update_excel(columns, day_rows('2024-01-01', 1))
+
+def test_missing_target_file_fails_the_upload(monkeypatch):
+    monkeypatch.setattr(upload, 'acquire_access_token', lambda *args: {'access_token': 'token', 'token_type': 'Bearer'})
+    monkeypatch.setattr(upload, 'download_target_file', lambda *args: None)
+    monkeypatch.setattr(upload.subprocess, 'run', lambda *args, **kwargs: subprocess.CompletedProcess(args, 0))
+
+    with pytest.raises(RuntimeError, match='not found'):
+        upload.sync_and_update_excel(columns, day_rows('2024-01-01', 1))
+
+def test_failed_upload_keeps_the_ticket_store_watermark(monkeypatch):
+    monkeypatch.setattr(upload, 'acquire_access_token', lambda *args: {'error': 'invalid_client'})
+    monkeypatch.setattr(pipeline, 'stages', {'organize': ([], lambda options: 'organized'),
+                                             'upload': (['organize'], lambda organized, options: pipeline.run_upload(None, options))})
+    store = TicketStore()
+    store.set_meta('pending_watermark', 3)
+    store.connection.commit()
+    store.close()
+
+    _, failed = pipeline.run_pipeline(['organize', 'upload'], use_ticket_store=True)
+
+    assert failed == {'upload'}
+    store = TicketStore()
+    try:
+        assert store.get_meta('watermark') == 0
+    finally:
+        store.close()
+
+def test_sheet_written_before_solved_tickets_gets_the_header():
+    workbook = openpyxl.Workbook()
+    workbook.active.title = 'Sheet1'
+    workbook.active.append(columns[:5])
+    workbook.active.append(day_rows('2024-01-01', 1)[0][:5])
+    workbook.save('target_2024-01.xlsx')
+
+    upload.append_partitioned(columns, day_rows('2024-01-02', 1), '.', 'target.xlsx', 'Sheet1', 'month')
+
+    rows = read_sheet('target_2024-01.xlsx')
+    assert rows[0] == columns
+    assert rows[1][:5] == day_rows('2024-01-01', 1)[0][:5]
+    assert rows[-1] == ['2024-01-02', 'Total', 1, None, None, 0]
+
+def test_empty_sheet_gets_the_header_once():
+    workbook = openpyxl.Workbook()
+    workbook.active.title = 'Sheet1'
+    workbook.save('target_2024-01.xlsx')
+
+    upload.append_partitioned(columns, day_rows('2024-01-01', 1), '.', 'target.xlsx', 'Sheet1', 'month')
+
+    rows = read_sheet('target_2024-01.xlsx')
+    assert rows[0] == columns
+    assert [row[:3] for row in rows[1:]] == [row[:3] for row in day_rows('2024-01-01', 1)]
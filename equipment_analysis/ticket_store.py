@@ -0,0 +1,96 @@
+import sqlite3
+import pandas as pd
+
+ticket_store_path = 'ticket_store.sqlite'  # Every extracted ticket, keyed by Zendesk ticket ID
+
+# Store column -> extracted column, in extracted_data.csv order
+column_names = {
+    'product': 'Product - Service Desk Tool',
+    'action': 'Action Taken',
+    'ticket_group': 'Ticket group',
+    'subject': 'Ticket subject',
+    'created_day': 'Ticket created - Day of month',
+    'created_month': 'Ticket created - Month',
+    'created_year': 'Ticket created - Year',
+    'tickets': 'Tickets',
+    'solved_date': 'Ticket solved - Date',
+    'reopens': 'Reopens',
+    'resolution_minutes': 'Full resolution time (minutes)'
+}
+
+# SQLite table of extracted tickets. Every upsert batch gets the next change sequence number, and a row only
+# takes it when the ticket is new or one of its values changed, so re-extracting the same tickets is a no-op.
+class TicketStore:
+    def __init__(self, db_path=ticket_store_path):
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER)')
+        self.connection.execute(f'''CREATE TABLE IF NOT EXISTS tickets (
+            ticket_id INTEGER PRIMARY KEY,
+            {', '.join(column_names)},
+            change_seq INTEGER NOT NULL)''')
+        # Stores created before a column was added get it as an empty column
+        existing_columns = {row[1] for row in self.connection.execute('PRAGMA table_info(tickets)')}
+        for column in column_names:
+            if column not in existing_columns:
+                self.connection.execute(f'ALTER TABLE tickets ADD COLUMN {column}')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS tickets_change_seq ON tickets (change_seq)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS tickets_created ON tickets (created_year, created_month, created_day)')
+        self.connection.commit()
+
+    def get_meta(self, key, default=0):
+        row = self.connection.execute('SELECT value FROM meta WHERE key = ?', (key,)).fetchone()
+        return default if row is None else row[0]
+
+    def set_meta(self, key, value):
+        self.connection.execute('INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (key, value))
+
+    # Function to insert or update a batch of extracted tickets (extract.TicketBatch) in one transaction;
+    # returns how many rows were new or changed
+    def upsert_many(self, tickets):
+        rows = list(tickets.rows(['Ticket ID'] + list(column_names.values())))
+        if not rows:
+            return 0
+
+        store_columns = list(column_names)
+        assignments = ', '.join(f'{column} = excluded.{column}' for column in store_columns)
+        changed = ' OR '.join(f'{column} IS NOT excluded.{column}' for column in store_columns)
+
+        with self.connection:
+            change_seq = self.get_meta('last_change_seq') + 1
+            before = self.connection.total_changes
+            self.connection.executemany(
+                f'''INSERT INTO tickets (ticket_id, {', '.join(store_columns)}, change_seq)
+                    VALUES (?, {', '.join('?' * len(store_columns))}, {change_seq})
+                    ON CONFLICT (ticket_id) DO UPDATE SET {assignments}, change_seq = excluded.change_seq
+                    WHERE {changed}''', rows)
+            changed_count = self.connection.total_changes - before
+            if changed_count:
+                self.set_meta('last_change_seq', change_seq)
+
+        print(f"Ticket store: {changed_count} of {len(rows)} tickets new or changed")
+        return changed_count
+
+    # Function to read every ticket of the days touched since the watermark, as an extracted DataFrame.
+    # Whole days are read back so the daily totals stay complete when only some of their tickets changed.
+    def read_pending(self):
+        watermark = self.get_meta('watermark')
+        last_change_seq = self.get_meta('last_change_seq')
+        query = f'''SELECT {', '.join(column_names)} FROM tickets
+                    WHERE (created_year, created_month, created_day) IN
+                        (SELECT created_year, created_month, created_day FROM tickets WHERE change_seq > ?)
+                    ORDER BY created_year, created_month, created_day, ticket_id'''
+        df = pd.read_sql_query(query, self.connection, params=(watermark,)).rename(columns=column_names)
+
+        # Remember what was read so the watermark only moves past it once the run has finished
+        with self.connection:
+            self.set_meta('pending_watermark', last_change_seq)
+        print(f"Ticket store: {len(df)} tickets on days changed since change {watermark}")
+        return df
+
+    # Function to mark everything returned by the last read_pending as processed
+    def advance_watermark(self):
+        with self.connection:
+            self.set_meta('watermark', self.get_meta('pending_watermark', self.get_meta('watermark')))
+
+    def close(self):
+        self.connection.close()
@@ -1,13 +1,360 @@
 import os
+import json
 import subprocess  # For running shell commands
+from datetime import date
+from urllib.parse import quote
+import requests
 import pandas as pd
 import msal
 from office365.sharepoint.client_context import ClientContext
-from io import BytesIO
 import openpyxl  # For manipulating Excel files
 import project_config  # Your config file with site_url, client_id, client_secret, tenant_id
 
-def sync_and_update_excel():
+# Optional partitioned layout: None keeps one growing workbook, 'month' or 'year' writes one workbook per period
+partition_layout = getattr(project_config, 'partition_layout', None)
+partition_formats = {'month': '%Y-%m', 'year': '%Y'}
+summary_sheet_name = 'Summary'
+summary_columns = ['Partition', 'Equipment Status', 'Equipment Category', 'Tickets']
+
+token_cache_path = 'msal_token_cache.bin'  # Client-credentials token, reused until it expires
+token_scope = ["https://graph.microsoft.com/.default"]  # Client-credentials scope requested from Azure AD
+sharepoint_state_path = 'sharepoint_cache.json'  # Server-relative URL and ETag of the downloaded target file
+download_cache_dir = 'sharepoint_cache'  # Last downloaded copy of the target file
+download_chunk_size = 1024 * 1024  # Stream downloads in 1 MB chunks
+
+# Function to load the persisted MSAL token cache
+def load_token_cache():
+    token_cache = msal.SerializableTokenCache()
+    if os.path.exists(token_cache_path):
+        with open(token_cache_path, 'r', encoding='utf-8') as cache_file:
+            token_cache.deserialize(cache_file.read())
+    return token_cache
+
+# Function to persist the MSAL token cache when a new token was acquired; readable by the owner only
+def save_token_cache(token_cache):
+    if token_cache.has_state_changed:
+        with os.fdopen(os.open(token_cache_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600), 'w', encoding='utf-8') as cache_file:
+            cache_file.write(token_cache.serialize())
+
+# Function to acquire a client-credentials token; MSAL answers from the persisted cache until the token expires.
+# http_client lets the tests send MSAL's requests to a stand-in instead of Azure AD.
+def acquire_access_token(client_id, client_secret, tenant_id, http_client=None):
+    token_cache = load_token_cache()
+    app = msal.ConfidentialClientApplication(
+        client_id,
+        authority=f"https://login.microsoftonline.com/{tenant_id}",
+        client_credential=client_secret,
+        token_cache=token_cache,
+        http_client=http_client,
+    )
+    result = app.acquire_token_for_client(scopes=token_scope)
+    save_token_cache(token_cache)
+    return result
+
+def load_sharepoint_state():
+    if not os.path.exists(sharepoint_state_path):
+        return {}
+    with open(sharepoint_state_path, 'r', encoding='utf-8') as state_file:
+        return json.load(state_file)
+
+def save_sharepoint_state(state):
+    with open(sharepoint_state_path, 'w', encoding='utf-8') as state_file:
+        json.dump(state, state_file)
+
+# Function to find the target file by listing its SharePoint folder (only when its URL is unknown)
+def find_target_file_url(ctx, folder_url, target_file_name):
+    operations_folder = ctx.web.get_folder_by_server_relative_url(folder_url)
+    files_collection = operations_folder.files
+    ctx.load(files_collection)
+    ctx.execute_query()
+
+    for file_item in files_collection:
+        if file_item.properties['Name'] == target_file_name:
+            return file_item.properties['ServerRelativeUrl']
+    return None
+
+# Function to stream an HTTP response body to a file in chunks
+def stream_to_file(response, path):
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as local_file:
+        for chunk in response.iter_content(chunk_size=download_chunk_size):
+            local_file.write(chunk)
+    os.replace(temp_path, path)
+
+# Function to download the target file only when it changed since the last download.
+# Returns the path of the local copy, or None when the file is not in SharePoint.
+def download_target_file(ctx, site_url, access_token, folder_url, target_file_name, allow_lookup=True):
+    state = load_sharepoint_state()
+    cached_path = os.path.join(download_cache_dir, target_file_name)
+    server_relative_url = state.get('server_relative_url') or f"{folder_url.rstrip('/')}/{target_file_name}"
+
+    headers = {'Authorization': f"Bearer {access_token}"}
+    if state.get('etag') and state.get('server_relative_url') == server_relative_url and os.path.exists(cached_path):
+        headers['If-None-Match'] = state['etag']
+
+    escaped_url = quote(server_relative_url.replace("'", "''"))
+    file_url = f"{site_url.rstrip('/')}/_api/web/GetFileByServerRelativeUrl('{escaped_url}')/$value"
+
+    with requests.get(file_url, headers=headers, stream=True) as response:
+        if response.status_code == 304:
+            print(f"File '{target_file_name}' unchanged in SharePoint, using the cached copy.")
+            return cached_path
+
+        if response.status_code == 404:
+            if not allow_lookup:
+                return None
+            # The remembered or assumed URL is wrong, so look the file up in its folder once
+            print(f"File '{target_file_name}' not found at '{server_relative_url}', searching the SharePoint folder...")
+            server_relative_url = find_target_file_url(ctx, folder_url, target_file_name)
+            if server_relative_url is None:
+                return None
+            save_sharepoint_state({'server_relative_url': server_relative_url})
+            return download_target_file(ctx, site_url, access_token, folder_url, target_file_name, allow_lookup=False)
+
+        response.raise_for_status()
+        print(f"File '{target_file_name}' found in SharePoint. Downloading for local processing...")
+        os.makedirs(download_cache_dir, exist_ok=True)
+        stream_to_file(response, cached_path)
+
+    save_sharepoint_state({'server_relative_url': server_relative_url, 'etag': response.headers.get('ETag')})
+    return cached_path
+
+# Sidecar file holding the dates already present in a workbook
+def get_index_path(workbook_path):
+    return workbook_path + '.dates.json'
+
+# Function to identify a workbook version without reading it
+def get_file_signature(path):
+    stat = os.stat(path)
+    return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+# Function to collect the dates in column 1 with a single read-only streaming pass
+def scan_existing_dates(workbook_source, sheet_name):
+    workbook = openpyxl.load_workbook(workbook_source, read_only=True)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            return set()
+        values = [value for (value,) in workbook[sheet_name].iter_rows(min_row=2, max_col=1, values_only=True) if value]
+    finally:
+        workbook.close()
+
+    parsed_dates = pd.to_datetime(pd.Series(values, dtype=object), errors='coerce').dropna()
+    return set(parsed_dates.dt.date)
+
+# Function to load the date index, rebuilding it when it is missing or the workbook changed since
+def load_date_index(workbook_path, sheet_name, workbook_source=None):
+    index_path = get_index_path(workbook_path)
+    if workbook_source is None and os.path.exists(index_path):
+        with open(index_path, 'r', encoding='utf-8') as index_file:
+            index = json.load(index_file)
+        if index.get('sheet_name') == sheet_name and index.get('signature') == get_file_signature(workbook_path):
+            print(f"Loaded {len(index['dates'])} existing dates from '{index_path}'.")
+            return {date.fromisoformat(value) for value in index['dates']}
+
+    print("Date index missing or out of date, rebuilding it from the workbook...")
+    return scan_existing_dates(workbook_source if workbook_source is not None else workbook_path, sheet_name)
+
+# Function to save the date index for the workbook as it is now on disk
+def save_date_index(workbook_path, sheet_name, dates):
+    index = {
+        'sheet_name': sheet_name,
+        'signature': get_file_signature(workbook_path),
+        'dates': sorted(value.isoformat() for value in dates)
+    }
+    with open(get_index_path(workbook_path), 'w', encoding='utf-8') as index_file:
+        json.dump(index, index_file)
+
+# Function to read the dates in the first column of rows; rows without a valid date are left out
+def get_row_dates(rows):
+    return set(pd.to_datetime(pd.Series([row[0] for row in rows], dtype=object), errors='coerce').dropna().dt.date)
+
+# Function to delete the rows of the given dates from a loaded sheet, together with the blank row that separates each
+# of their blocks from the previous one (or, right below the header, from the next one). Returns the deleted rows.
+def remove_date_rows(sheet, dates):
+    first_column = [value for (value,) in sheet.iter_rows(min_row=2, max_col=1, values_only=True)]
+    row_dates = pd.to_datetime(pd.Series(first_column, dtype=object), errors='coerce').dt.date
+    row_numbers = [row_number for row_number, row_date in enumerate(row_dates, start=2) if row_date in dates]
+
+    # Consecutive rows are deleted as one block, bottom block first so the row numbers above stay valid
+    blocks = []
+    for row_number in row_numbers:
+        if blocks and blocks[-1][1] == row_number:
+            blocks[-1][1] += 1
+        else:
+            blocks.append([row_number, row_number + 1])
+    removed_rows = [[cell.value for cell in sheet[row_number]] for row_number in row_numbers]
+    for start, end in reversed(blocks):
+        if start > 2 and sheet.cell(row=start - 1, column=1).value is None:
+            start -= 1
+        elif end <= sheet.max_row and sheet.cell(row=end, column=1).value is None:
+            end += 1
+        sheet.delete_rows(start, end - start)
+    return removed_rows
+
+# Function to make the header row of a loaded sheet match the uploaded columns. An empty sheet gets the whole header;
+# a sheet written before a column was added at the end (e.g. 'Solved Tickets') gets the missing header cells.
+def ensure_header(sheet, columns):
+    header = [cell.value for cell in sheet[1]]
+    while header and header[-1] is None:
+        header.pop()
+    columns = list(columns)
+
+    if not header:
+        print("Inserting column headers...")
+        missing_columns = columns
+    elif header == columns[:len(header)]:
+        missing_columns = columns[len(header):]
+        if missing_columns:
+            print(f"Adding the missing column headers {missing_columns}...")
+    else:
+        print(f"Warning: the sheet's header {header} does not match the uploaded columns {columns}")
+        return
+    for column_number, column in enumerate(missing_columns, start=len(header) + 1):
+        sheet.cell(row=1, column=column_number, value=column)
+
+# Function to decide whether a new row goes in: total rows always do, other rows only for new dates
+def should_append(row, existing_dates):
+    date_value = pd.to_datetime(row[0], errors='coerce')
+    return str(row[0]).strip().lower() == "total" or pd.isna(date_value) or date_value.date() not in existing_dates
+
+# Function to add a batch of rows to a loaded sheet and return the rows it added and the rows it replaced.
+# By default the rows of dates already in the sheet are skipped, so rerunning a day changes nothing.
+# A partial batch (an incremental run's delta) adds to the rows of its days instead. With replace_days, every day
+# of the batch replaces the rows an earlier run wrote for it (a ticket store run re-reading changed days).
+# openpyxl does not adjust formulas, defined names, charts or merged ranges that refer to the deleted rows,
+# so replace_days is only safe for sheets that hold nothing but the uploaded rows.
+def add_rows(sheet, rows, existing_dates, partial_days=False, replace_days=False):
+    removed_rows = []
+    if partial_days:
+        added_rows = rows
+    elif replace_days:
+        replaced_dates = existing_dates & get_row_dates(rows)
+        removed_rows = remove_date_rows(sheet, replaced_dates) if replaced_dates else []
+        if removed_rows:
+            print(f"Replacing {len(removed_rows)} rows of {len(replaced_dates)} dates already in the sheet...")
+        added_rows = rows
+    else:
+        added_rows = [row for row in rows if should_append(row, existing_dates)]
+        if len(added_rows) < len(rows):
+            print(f"Skipping {len(rows) - len(added_rows)} rows of dates already in the sheet.")
+
+    # Keep the blank row between daily blocks
+    if added_rows and sheet.max_row > 1:
+        sheet.append([])
+    for row in added_rows:
+        sheet.append(row)
+    return added_rows, removed_rows
+
+# Function to load the aggregated header and rows, streaming the converted workbook unless they were handed over in memory
+def load_new_data(columns, rows, local_new_data_path):
+    if rows is not None:
+        return list(columns), rows
+
+    workbook = openpyxl.load_workbook(local_new_data_path, read_only=True)
+    try:
+        all_rows = [list(row) for row in workbook.active.iter_rows(values_only=True)]
+    finally:
+        workbook.close()
+    print(f"New data loaded from '{local_new_data_path}'.")
+    return all_rows[0], all_rows[1:]
+
+def get_partition_path(folder_path, target_file_name, partition_key):
+    stem, extension = os.path.splitext(target_file_name)
+    return os.path.join(folder_path, f"{stem}_{partition_key}{extension}")
+
+def get_summary_path(folder_path, target_file_name):
+    stem, extension = os.path.splitext(target_file_name)
+    return os.path.join(folder_path, f"{stem}_summary{extension}")
+
+# Function to append rows to a single partition workbook; no other partition is ever opened.
+# Returns the appended rows and the rows they replaced (see add_rows).
+def append_to_partition(partition_path, sheet_name, columns, rows, partial_days=False, replace_days=False):
+    if not rows:
+        print(f"No rows for '{partition_path}'.")
+        return [], []
+
+    removed_rows = []
+    if os.path.exists(partition_path):
+        existing_dates = load_date_index(partition_path, sheet_name)
+        workbook = openpyxl.load_workbook(partition_path)
+        sheet = workbook[sheet_name] if sheet_name in workbook.sheetnames else workbook.create_sheet(sheet_name)
+        ensure_header(sheet, columns)
+        rows, removed_rows = add_rows(sheet, rows, existing_dates, partial_days, replace_days)
+        if not rows:
+            print(f"No new dates for '{partition_path}'.")
+            return [], []
+    else:
+        # A new partition is written through the streaming write-only workbook
+        print(f"Creating partition workbook '{partition_path}'...")
+        existing_dates = set()
+        workbook = openpyxl.Workbook(write_only=True)
+        sheet = workbook.create_sheet(sheet_name)
+        sheet.append(columns)
+        for row in rows:
+            sheet.append(row)
+
+    workbook.save(partition_path)
+    save_date_index(partition_path, sheet_name, existing_dates | get_row_dates(rows))
+    print(f"Appended {len(rows)} rows to '{partition_path}'.")
+    return rows, removed_rows
+
+# Function to fold the appended status totals and totals into the small summary workbook,
+# taking out those of the rows they replaced
+def update_summary(summary_path, columns, appended_rows_by_partition, removed_rows_by_partition=None):
+    totals = {}
+    if os.path.exists(summary_path):
+        workbook = openpyxl.load_workbook(summary_path, read_only=True)
+        for partition, status, category, tickets in workbook[summary_sheet_name].iter_rows(min_row=2, values_only=True):
+            totals[(partition, status or '', category or '')] = tickets
+        workbook.close()
+
+    subject_index = columns.index('Ticket subject')
+    tickets_index = columns.index('Tickets')
+    status_index = columns.index('Equipment Status')
+    category_index = columns.index('Equipment Category')
+
+    for sign, rows_by_partition in ((1, appended_rows_by_partition), (-1, removed_rows_by_partition or {})):
+        for partition_key, rows in rows_by_partition.items():
+            for row in rows:
+                if row[subject_index] == 'Status Total':
+                    key = (partition_key, row[status_index] or '', row[category_index] or '')
+                elif row[subject_index] == 'Total':
+                    key = (partition_key, 'Total', '')
+                else:
+                    continue
+                totals[key] = totals.get(key, 0) + sign * int(row[tickets_index])
+
+    # The summary is small, so it is rewritten in full
+    workbook = openpyxl.Workbook(write_only=True)
+    sheet = workbook.create_sheet(summary_sheet_name)
+    sheet.append(summary_columns)
+    for (partition_key, status, category), tickets in sorted(totals.items()):
+        sheet.append([partition_key, status, category, tickets])
+    workbook.save(summary_path)
+    print(f"Summary totals saved to '{summary_path}'.")
+
+# Function to append the new data to per-period workbooks and refresh the summary
+def append_partitioned(columns, new_rows, folder_path, target_file_name, sheet_name, layout, partial_days=False, replace_days=False):
+    rows_by_partition = {}
+    for row in new_rows:
+        date_value = pd.to_datetime(row[0], errors='coerce')
+        if pd.isna(date_value):
+            print(f"Skipping row without a valid date: {row}")
+            continue
+        rows_by_partition.setdefault(date_value.strftime(partition_formats[layout]), []).append(row)
+
+    appended_rows_by_partition = {}
+    removed_rows_by_partition = {}
+    for partition_key, rows in sorted(rows_by_partition.items()):
+        partition_path = get_partition_path(folder_path, target_file_name, partition_key)
+        appended_rows_by_partition[partition_key], removed_rows_by_partition[partition_key] = \
+            append_to_partition(partition_path, sheet_name, columns, rows, partial_days, replace_days)
+
+    update_summary(get_summary_path(folder_path, target_file_name), columns, appended_rows_by_partition, removed_rows_by_partition)
+
+# Entry point: add the aggregated rows to the target workbook. Rows of days already in the workbook are skipped,
+# unless partial_days is set (an incremental run's delta adds to them) or replace_days is (they replace them, see add_rows).
+def sync_and_update_excel(columns=None, new_rows=None, partial_days=False, replace_days=False):
     # Configuration from project_config
     site_url = project_config.site_url
     client_id = project_config.client_id
@@ -20,8 +367,6 @@ def sync_and_update_excel():
 
     target_file_path = os.path.join(onedrive_folder_path, target_file_name)
 
-    scope = ["https://graph.microsoft.com/.default"]
-
     def sync_onedrive():
         print("Syncing OneDrive...")
         try:
@@ -34,22 +379,23 @@ def sync_and_update_excel():
             print(f"Error syncing OneDrive: {e}")
 
     print("Authenticating to SharePoint...")
-    app = msal.ConfidentialClientApplication(
-        client_id,
-        authority=f"https://login.microsoftonline.com/{tenant_id}",
-        client_credential=client_secret,
-    )
-
     print("Acquiring access token...")
-    result = app.acquire_token_for_client(scopes=scope)
+    result = acquire_access_token(client_id, client_secret, tenant_id)
 
     if "access_token" in result:
         print("Access token acquired successfully.")
         
-        ctx = ClientContext(site_url).with_access_token(result["access_token"])
+        # office365 expects a callback returning the token response, not the bare token
+        ctx = ClientContext(site_url).with_access_token(lambda: result)
 
         sync_onedrive()
 
+        # Partitioned layout: only the current period's workbook and the summary are touched
+        if partition_layout:
+            columns, new_rows = load_new_data(columns, new_rows, local_new_data_path)
+            append_partitioned(columns, new_rows, onedrive_folder_path, target_file_name, sheet_name, partition_layout, partial_days, replace_days)
+            return
+
         def load_or_create_sheet(workbook, sheet_name):
             if sheet_name in workbook.sheetnames:
                 print(f"Sheet '{sheet_name}' exists, loading data...")
@@ -58,83 +404,41 @@ def sync_and_update_excel():
                 print(f"Sheet '{sheet_name}' does not exist, creating new sheet...")
                 return workbook.create_sheet(sheet_name)
 
-        def extract_existing_dates(sheet):
-            try:
-                return {
-                    pd.to_datetime(sheet.cell(row=i, column=1).value, errors='coerce').date()
-                    for i in range(2, sheet.max_row + 1) if sheet.cell(row=i, column=1).value
-                }
-            except Exception as e:
-                print(f"Error extracting existing dates: {e}")
-                return set()
-
         if os.path.exists(target_file_path):
+            # Read the date index before the workbook so a rebuild sees the file as it is on disk
+            existing_dates = load_date_index(target_file_path, sheet_name)
+
             print(f"Opening the existing Excel file from '{target_file_path}'...")
             workbook = openpyxl.load_workbook(target_file_path)
             existing_sheet = load_or_create_sheet(workbook, sheet_name)
         else:
-            print(f"File '{target_file_name}' does not exist locally. Downloading from SharePoint...")
-            folder_url = project_config.folder_url
-            operations_folder = ctx.web.get_folder_by_server_relative_url(folder_url)
-            ctx.load(operations_folder)
-            ctx.execute_query()
-
-            files_collection = operations_folder.files
-            ctx.load(files_collection)
-            ctx.execute_query()
-
-            target_file_found = False
-            for file_item in files_collection:
-                if file_item.properties['Name'] == target_file_name:
-                    target_file_found = True
-                    target_file = file_item
-                    break
-
-            if target_file_found:
-                print(f"File '{target_file_name}' found in SharePoint. Downloading for local processing...")
-                existing_file_stream = BytesIO()
-                target_file.download(existing_file_stream).execute_query()
-                existing_file_stream.seek(0)
-                workbook = openpyxl.load_workbook(existing_file_stream)
+            print(f"File '{target_file_name}' does not exist locally. Checking SharePoint...")
+            cached_path = download_target_file(ctx, site_url, result["access_token"], project_config.folder_url, target_file_name)
+
+            if cached_path:
+                existing_dates = load_date_index(target_file_path, sheet_name, cached_path)
+                workbook = openpyxl.load_workbook(cached_path)
                 existing_sheet = load_or_create_sheet(workbook, sheet_name)
             else:
-                print(f"Target file '{target_file_name}' not found in the SharePoint folder.")
-                return  # Use return instead of exit()
-
-        new_data_df = pd.read_excel(local_new_data_path)
-        print(f"New data loaded from '{local_new_data_path}'.")
+                # Raise instead of returning, so run_pipeline marks the upload failed and keeps its watermarks
+                raise RuntimeError(f"Target file '{target_file_name}' not found in the SharePoint folder.")
 
-        if existing_sheet.max_row == 1:
-            print("Inserting column headers...")
-            existing_sheet.append(list(new_data_df.columns))
+        # Read the converted workbook unless the pipeline handed the aggregated rows over in memory
+        columns, new_data_list = load_new_data(columns, new_rows, local_new_data_path)
 
-        existing_dates = extract_existing_dates(existing_sheet)
+        ensure_header(existing_sheet, columns)
 
-        # Ensure a blank row is added if there is data in the sheet
-        if existing_sheet.max_row > 1:
-            print("Inserting a blank row before appending new data...")
-            existing_sheet.append([])
-
-        new_data_list = new_data_df.values.tolist()
-        next_row = existing_sheet.max_row + 1
-        print(f"Appending new data starting from row {next_row}...")
-
-        for row in new_data_list:
-            try:
-                date_value = pd.to_datetime(row[0], errors='coerce').date()
-                if row[0].strip().lower() == "total" or date_value not in existing_dates:
-                    existing_sheet.append(row)
-                    print(f"Added new data for date or total: {row}")
-                else:
-                    print(f"Skipping existing date: {date_value}")
-            except Exception as e:
-                print(f"Error processing row {row}: {e}")
+        print(f"Appending {len(new_data_list)} rows after row {existing_sheet.max_row}...")
+        add_rows(existing_sheet, new_data_list, existing_dates, partial_days, replace_days)
 
         # Save changes to the workbook
         workbook.save(target_file_path)
         print(f"Updated data saved to '{target_file_path}'.")
+
+        # Record the saved workbook's dates so the next run does not have to scan it
+        save_date_index(target_file_path, sheet_name, existing_dates | get_row_dates(new_data_list))
     else:
-        print("Error acquiring token:", result.get("error"), result.get("error_description"))
+        raise RuntimeError(f"Error acquiring token: {result.get('error')} {result.get('error_description')}")
 
 if __name__ == "__main__":
     sync_and_update_excel()